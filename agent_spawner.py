@@ -1,29 +1,99 @@
 import threading
 import time
 
-from typing import List, Tuple
+from typing import Dict, List, Protocol, Tuple, cast
 
 from chinesecheckers.agents.Agent import Agent
+from chinesecheckers.agents.PositionCache import PositionCache
 from chinesecheckers.agents.evaluators import evaluators
-from chinesecheckers.agents import agents
-
-agents_to_spawn: List[Tuple[str, str]] = [
-    # ("max", "random"),
-    ("max", "distance"),
-    ("max", "distance"),
-    ("max", "distance"),
-    ("max", "distance"),
-    ("max", "distance"),
+from chinesecheckers.agents.frontiers import frontiers
+from chinesecheckers.agents import agents, node_types
+
+
+# what agents' constructors all look like, given options for
+# the right kind of agent
+class _AgentType(Protocol):
+    def __call__(self, *args: object, **options: object) -> Agent:
+        ...
+
+
+# (agent, evaluator, board representation). maxn and paranoid
+# only search "makeunmake" trees, and mcts needs "grid" or
+# "bitboard"
+agents_to_spawn: List[Tuple[str, str, str]] = [
+    # ("max", "random", "grid"),
+    ("max", "distance", "bitboard"),
+    ("max", "distance", "bitboard"),
+    ("max", "distance", "bitboard"),
+    ("max", "distance", "bitboard"),
+    ("max", "distance", "bitboard"),
 ]
 
-spawned_agents: List[Tuple[Agent, threading.Thread]] = []
+# positions each agent's transposition table remembers
+TABLE_SIZE = 1 << 16
+# bytes of search tree each agent keeps before evicting nodes
+TREE_BUDGET = 256 << 20
+# most seconds each agent takes to answer a move request. it
+# answers sooner when the best move is clear
+MOVE_TIME = 3
+# give each agent's search its own process, so the agents here
+# aren't all sharing one GIL with the threads talking to the server
+SEARCH_PROCESS = True
+# the order max agents expand their trees in (see frontiers.py).
+# a beam gets far deeper than breadth first in the same nodes
+FRONTIER = "beam"
+# let the max agents share the moves they generate for each
+# position (see PositionCache.py). a search in its own process
+# can't share one, so this is only on without SEARCH_PROCESS
+SHARED_CACHE = not SEARCH_PROCESS
+# bytes the shared cache keeps before throwing out positions. on
+# top of each agent's TREE_BUDGET
+SHARED_CACHE_BYTES = 64 << 20
+# talk to the server in the compact binary encoding instead of
+# json (see protocol.py)
+BINARY_PROTOCOL = True
+
+# guarded, since spawned search processes import this module too
+if __name__ == "__main__":
+    shared_cache = PositionCache(SHARED_CACHE_BYTES) if SHARED_CACHE else None
+
+    # what every agent is made with, and on top of that what each
+    # kind takes. mcts has no transposition table, since merging
+    # nodes would mix up their visit counts
+    common_options: Dict[str, object] = {
+        "max_tree_bytes": TREE_BUDGET,
+        "move_time": MOVE_TIME,
+        "search_process": SEARCH_PROCESS,
+        "binary_protocol": BINARY_PROTOCOL,
+    }
+    agent_options: Dict[str, Dict[str, object]] = {
+        "max": {
+            "table_size": TABLE_SIZE,
+            "shared_cache": shared_cache,
+            "frontier": frontiers[FRONTIER],
+        },
+        "maxn": {"table_size": TABLE_SIZE},
+        "paranoid": {"table_size": TABLE_SIZE},
+        "mcts": {},
+    }
+
+    spawned_agents: List[Tuple[Agent, threading.Thread]] = []
 
-for agent in agents_to_spawn:
-    print("spawning", agent)
-    a = agents[agent[0]]("127.0.0.1", 41047, evaluators[agent[1]])
-    t = threading.Thread(target=a.play, daemon=True)
-    t.start()
-    spawned_agents.append((a, t))
+    for agent in agents_to_spawn:
+        print("spawning", agent)
+        # the options differ by kind of agent, which mypy can't
+        # follow through the agents dict
+        make_agent = cast(_AgentType, agents[agent[0]])
+        a = make_agent(
+            "127.0.0.1", 41047,
+            evaluators[agent[1]],
+            node_types[agent[2]],
+            **common_options,
+            **agent_options[agent[0]],
+        )
+        t = threading.Thread(target=a.play, daemon=True)
+        t.start()
+        spawned_agents.append((a, t))
 
-while True:
-    time.sleep(1)
+    while True:
+        time.sleep(1)
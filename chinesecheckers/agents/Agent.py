@@ -1,35 +1,123 @@
 import abc
+import multiprocessing
+import multiprocessing.process
 import socket
 import threading
 import time
-import json
 
-from typing import Callable, List, Optional, Tuple, Union, cast
+from typing import Callable, ClassVar, Dict, List, Optional, Protocol, Tuple, Type, Union, cast
 
-from chinesecheckers.agents.GameBoardNode import GameBoardNode
+from chinesecheckers.agents.BitBoardNode import BitBoardNode
+from chinesecheckers.agents.GameBoardNode import GameBoardNode, _Move
+from chinesecheckers.agents.MoveClock import MoveClock
+from chinesecheckers.agents.MoveNode import MoveNode
+from chinesecheckers.agents.PositionCache import PositionCache
+from chinesecheckers.agents.TranspositionTable import TranspositionTable
+from chinesecheckers.agents.bitboard import masks_from_board, moves_from_cell
+from chinesecheckers.geometry import CELL_INDEX
+from chinesecheckers.protocol import MessageReader, encode, encode_binary, hello_payload
 
-_ClientPayload = Optional[Union[str, List[Tuple[int, int]]]]
+_Node = Union[GameBoardNode, MoveNode]
+_ClientPayload = Optional[Union[int, List[object], List[Tuple[int, int]]]]
 _ServerMessage = Optional[Union[int, List[List[int]]]]
 
+# an over budget tree is cut back to this fraction of the budget,
+# so eviction doesn't have to run again a few nodes later
+_EVICT_TO = 0.75
+# seconds between looks at the tree while waiting for the
+# search to decide on a move
+_CLOCK_TICK = 0.05
+
+# (moves followed so far, move it would play, number of moves at
+# the root), as sent from a search process to the process talking
+# to the server whenever the search changes its mind. the move is
+# None only before the search has said anything
+_BestMove = Tuple[int, Optional[_Move], int]
+# ("start", (board, starting player)), ("move", move), ("turn",
+# whether it started) or ("game_over", None), sent the other way
+_Command = Tuple[str, Optional[Union[Tuple[List[List[int]], int], _Move, bool]]]
+
+# search processes, and MctsAgent's pools, are spawned rather than
+# forked. the agents in a process are threads, and a fork only
+# copies the thread that made it, so the child could start out with
+# a lock another thread held, like stdout's or Agent._wakeup, that
+# nothing is left to release
+_PROCESSES = multiprocessing.get_context("spawn")
+# what a search process isn't given a copy of: the connection to
+# the server stays with the agent, and the lock and dead trees
+# belong to the agent's own threads
+_NOT_COPIED = ("_server", "_reader", "_tree_lock", "_dead")
+
+
+class _Pipe(Protocol):
+    # one end of a multiprocessing pipe, as the agents use it
+    def send(self, obj: object) -> None:
+        ...
+
+    def recv(self) -> object:
+        ...
+
+    def poll(self, timeout: float) -> bool:
+        ...
+
+    def close(self) -> None:
+        ...
+
 
 class Agent(abc.ABC):
+    # every agent in the process waits on this when it has nothing
+    # to do, and anything that could give one something to do
+    # notifies it. agents in one process also share the GIL, so
+    # none of them ponders while _agents_on_turn of them are
+    # picking a move
+    _wakeup: ClassVar[threading.Condition] = threading.Condition()
+    _agents_on_turn: ClassVar[int] = 0
+
     __slots__ = (
         "_server",
+        "_reader",
         "_player_id",
         "_board",
         "_evaluator",
         "_root",
+        "_node_type",
+        "_tree_lock",
+        "_table",
+        "_dead",
+        "_max_nodes",
+        "_ponder",
+        "_clock",
+        "_search_process",
+        "_moves_followed",
     )
 
     def __init__(
         self,
         host: str,
         port: int,
-        evaluator: Callable[[GameBoardNode], Callable[[GameBoardNode], float]]
+        evaluator: Callable[[GameBoardNode], Callable[[GameBoardNode], float]],
+        node_type: Union[Type[GameBoardNode], Type[MoveNode]] = GameBoardNode,
+        table_size: int = 0,
+        max_nodes: int = 0,
+        max_tree_bytes: int = 0,
+        ponder: Optional[bool] = None,
+        move_time: float = 3,
+        safety_margin: float = 0.25,
+        search_process: bool = False,
+        shared_cache: Optional[PositionCache] = None,
+        binary_protocol: bool = False,
     ) -> None:
+        if shared_cache is not None and table_size == 0:
+            raise ValueError("a shared cache is used through the transposition table")
+        if shared_cache is not None and search_process:
+            # the search would only have a copy of it
+            raise ValueError("a search in its own process can't share a cache")
         self._server = socket.socket()
         self._server.connect((host, port))
-        self._send("hello", "12345")
+        self._reader = MessageReader(self._server)
+        self._send("hello", hello_payload(binary_protocol))
+        if binary_protocol:
+            self._reader.set_binary()
 
         msg, payload = self._receive()
         if msg == "no":
@@ -39,32 +127,82 @@ class Agent(abc.ABC):
         self._player_id = cast(int, payload)
 
         self._evaluator = evaluator
+        self._node_type = node_type
+        # held while the tree (and for MoveNodes, the shared
+        # board under it) is being changed
+        self._tree_lock = threading.Lock()
+        self._table: Optional[TranspositionTable] = None
+        if table_size > 0:
+            self._table = TranspositionTable(table_size)
+            if shared_cache is not None:
+                self._table.share(shared_cache)
+        # roots of trees that were cut off by a move, waiting to be
+        # taken apart by release_dead_nodes
+        self._dead: List[_Node] = []
+        # the most nodes the tree may have before evict_nodes cuts
+        # it back, or 0 for no limit. a byte budget is turned into
+        # a node budget with the node type's size estimate
+        self._max_nodes = max_nodes
+        if max_tree_bytes > 0:
+            budget = max_tree_bytes // node_type.NODE_BYTES
+            if self._max_nodes == 0 or budget < self._max_nodes:
+                self._max_nodes = budget
+        # whether to keep searching during the other players' turns.
+        # with no budget that grows the tree through every one of
+        # them without end, so unless told otherwise only an agent
+        # with a budget ponders
+        self._ponder = self._max_nodes > 0 if ponder is None else ponder
+        self._clock = MoveClock(move_time, safety_margin)
+        # whether to search in a separate process, see play_remote
+        self._search_process = search_process
+        self._moves_followed = 0
+
+    def __getstate__(self) -> Dict[str, object]:
+        # what a search process starts from, see play_remote
+        state: Dict[str, object] = {}
+        for cls in type(self).__mro__:
+            for name in cls.__dict__.get("__slots__", ()):
+                if name not in _NOT_COPIED and hasattr(self, name):
+                    state[name] = getattr(self, name)
+        return state
+
+    def __setstate__(self, state: Dict[str, object]) -> None:
+        for name, value in state.items():
+            setattr(self, name, value)
+        self._tree_lock = threading.Lock()
+        self._dead = []
 
     def _send(self, msg: str, payload: _ClientPayload) -> None:
-        print(
-            f'sending {{"msg": "{msg}", "payload": {payload}}}\n'
-                .replace("(", "[")  # noqa - flake8 wants it one tab left, which is nonsense
-                .replace(")", "]")
-        )
-        self._server.send(bytes(
-            f'{{"msg": "{msg}", "payload": {payload}}}\n'
-                .replace("(", "[")  # noqa
-                .replace(")", "]"),
-            "ascii"
-        ))
+        print("sending", msg, payload)
+        if self._reader.binary:
+            self._server.sendall(encode_binary(msg, payload))
+        else:
+            self._server.sendall(encode(msg, payload))
 
     def _receive(self) -> Tuple[str, _ServerMessage]:
-        msg: List[bytes] = []
-        while len(msg) == 0 or msg[-1][-1] != ord("}"):
-            msg.append(self._server.recv(256))
-        data = json.loads(b"".join(msg))  # type: ignore
-        print(data)
-        return (
-            data.get("msg", "error"),
-            data.get("payload", None)
-        )
+        msg, payload = self._reader.receive()
+        print(msg, payload)
+        return msg, cast(_ServerMessage, payload)
 
     def play(self) -> None:
+        if self._search_process:
+            self.play_remote()
+            return
+
+        self._init_root(self._receive_game())
+        print("ready")
+        game_over_flag = threading.Event()
+        explore_flag = threading.Event()
+        sock_thread = threading.Thread(
+            target=self.handle_incoming,
+            args=(game_over_flag, explore_flag),
+            daemon=True,
+        )
+        sock_thread.start()
+        self.manage_tree_forever(game_over_flag, explore_flag)
+
+    def _receive_game(self) -> int:
+        # sets up self._board, and returns the starting player
         msg, payload = self._receive()
         if msg != "board_init":
             raise RuntimeError("wtf 2")
@@ -73,26 +211,17 @@ class Agent(abc.ABC):
         msg, payload = self._receive()
         if msg != "starting_player":
             raise RuntimeError("wtf 3")
-        starting_player = cast(int, payload)
+        return cast(int, payload)
 
-        self._root = GameBoardNode.root_init(
+    def _init_root(self, starting_player: int) -> None:
+        self._root: _Node = self._node_type.root_init(
             self._board,
             self._evaluator,
             self._player_id,
-            starting_player
+            starting_player,
+            self._table,
         )
 
-        print("ready")
-        game_over_flag = threading.Event()
-        explore_flag = threading.Event()
-        sock_thread = threading.Thread(
-            target=self.handle_incoming,
-            args=(game_over_flag, explore_flag),
-            daemon=True,
-        )
-        sock_thread.start()
-        self.manage_tree_forever(game_over_flag, explore_flag)
-
     def handle_incoming(
         self,
         game_over_flag: threading.Event,
@@ -101,46 +230,337 @@ class Agent(abc.ABC):
         while True:
             msg, payload = self._receive()
             if msg == "move":
-                payload = cast(List[List[int]], payload)
-                source = payload[0]
-                dest = payload[-1]
-                self._board[dest[0]][dest[1]] = self._board[source[0]][source[1]]
-                self._board[source[0]][source[1]] = 0
-                k = cast(Tuple[Tuple[int, int], Tuple[int, int]], (tuple(source), tuple(dest)))
-                if k not in self._root.children:
-                    print("aaaaaaaaaaaaaaaaaaaaaaaaaa")
-                    self.expand_once()
-
-                old_root = self._root
-                self._root = self._root.children.pop(k)
-                hi = time.perf_counter_ns()
-                p = old_root.prune()
-                print(time.perf_counter_ns()-hi, "ns to prune", p)
-                self._root.parent = None
-                self._root.score = 0
+                self._follow_move(self._move_on_board(payload))
             elif msg == "request_move":
-                explore_flag.set()
-                print("set move")
-                time.sleep(3)
-                explore_flag.clear()
-                print("clear move", self._root.current_player_id)
-                self._send("make_move", self._root.best_child.hop_chain)  # type: ignore
+                with self._tree_lock:
+                    self._clock.start(self._best_move_so_far())
+                self._start_turn(explore_flag)
+                while True:
+                    with self._tree_lock:
+                        done = self._clock.done(
+                            len(self._root.children),
+                            self._best_move_so_far(),
+                        )
+                    if done:
+                        break
+                    time.sleep(min(_CLOCK_TICK, self._clock.time_left()))
+                self._end_turn(explore_flag)
+                print("clear move after", round(self._clock.elapsed(), 2), "s")
+                with self._tree_lock:
+                    best_move = self.choose_move()
+                    hop_chain = self._root.hop_chain(best_move)
+                self._send("make_move", hop_chain)
             elif msg == "game_over":
                 game_over_flag.set()
+                self._notify()
                 self._server.close()
                 return
             else:
                 raise RuntimeError("wtf 4")
 
+    def _move_on_board(self, payload: _ServerMessage) -> _Move:
+        # plays a move from the server on self._board
+        hop_chain = cast(List[List[int]], payload)
+        source = hop_chain[0]
+        dest = hop_chain[-1]
+        self._board[dest[0]][dest[1]] = self._board[source[0]][source[1]]
+        self._board[source[0]][source[1]] = 0
+        return cast(_Move, (tuple(source), tuple(dest)))
+
+    def _follow_move(self, move: _Move) -> None:
+        with self._tree_lock:
+            if move not in self._root.children:
+                print("aaaaaaaaaaaaaaaaaaaaaaaaaa")
+                self.expand_once()
+
+            old_root = self._root
+            self._root = self._root.reroot(move)
+            if self._table is not None:
+                self._table.new_generation()
+            self._dead.append(old_root)
+            self._moves_followed += 1
+        self._notify()
+
+    def _start_turn(self, explore_flag: threading.Event) -> None:
+        with Agent._wakeup:
+            Agent._agents_on_turn += 1
+            explore_flag.set()
+            Agent._wakeup.notify_all()
+        print("set move")
+
+    def _end_turn(self, explore_flag: threading.Event) -> None:
+        with Agent._wakeup:
+            Agent._agents_on_turn -= 1
+            explore_flag.clear()
+            Agent._wakeup.notify_all()
+        if self._table is not None:
+            print("transposition table:", self._table)
+        print(
+            "tree:", self._root.size(), "nodes,",
+            "about", self.tree_memory() >> 20, "MiB",
+        )
+
+    def play_remote(self) -> None:
+        # plays with the search in a child process, so it can't
+        # starve this one of the GIL. the child gets the game, moves
+        # and turns through a pipe, and sends back the move it would
+        # play every time that changes. this process answers
+        # request_move from the last move it heard about, so the
+        # answer is on time however busy the search is
+        conn, child_conn = _PROCESSES.Pipe()
+        # the child gets a pickled copy of this agent (see
+        # __getstate__), and is started before the game since a new
+        # interpreter takes a while to get going. not a daemon, since
+        # the search may start a pool of its own, so it is shut down
+        # below instead
+        search = _PROCESSES.Process(
+            target=self._search_remotely,
+            args=(child_conn,),
+        )
+        search.start()
+        child_conn.close()
+        try:
+            self._play_remote(conn, search, self._receive_game())
+        finally:
+            # closed only once the search is gone, since _play_remote's
+            # listener can still be waiting on it until then
+            search.join(1)
+            if search.is_alive():
+                search.terminate()
+                search.join()
+            conn.close()
+
+    def _play_remote(
+        self,
+        conn: _Pipe,
+        search: multiprocessing.process.BaseProcess,
+        starting_player: int,
+    ) -> None:
+        best: List[_BestMove] = [(0, None, 0)]
+        heard = threading.Condition()
+
+        def listen() -> None:
+            while True:
+                try:
+                    update = cast(_BestMove, conn.recv())
+                except (EOFError, OSError):
+                    return
+                with heard:
+                    best[0] = update
+                    heard.notify_all()
+
+        threading.Thread(target=listen, daemon=True).start()
+
+        def best_now() -> Tuple[Optional[_Move], int]:
+            # the search's best move and number of moves, if it is
+            # about the current position
+            moves_followed, move, num_moves = best[0]
+            if moves_followed != self._moves_followed:
+                return None, 0
+            return move, num_moves
+
+        def tell(command: _Command) -> bool:
+            # whether the search is still there to be told. if it
+            # has died, moves are picked by _quick_move instead
+            try:
+                conn.send(command)
+            except (EOFError, OSError):
+                return False
+            return True
+
+        searching = tell(("start", (self._board, starting_player)))
+        print("ready")
+        while True:
+            msg, payload = self._receive()
+            if msg == "move":
+                move = self._move_on_board(payload)
+                with heard:
+                    self._moves_followed += 1
+                searching = searching and tell(("move", move))
+            elif msg == "request_move":
+                searching = searching and tell(("turn", True))
+                with heard:
+                    self._clock.start(best_now()[0])
+                    while searching and search.is_alive():
+                        best_move, num_moves = best_now()
+                        if self._clock.done(num_moves, best_move):
+                            break
+                        heard.wait(min(_CLOCK_TICK, self._clock.time_left()))
+                    best_move = best_now()[0]
+                searching = searching and tell(("turn", False))
+                print("clear move after", round(self._clock.elapsed(), 2), "s")
+                if best_move is None:
+                    print("no move from the search")
+                    best_move = self._quick_move()
+                self._send("make_move", self._hop_chain_on_board(best_move))
+            elif msg == "game_over":
+                tell(("game_over", None))
+                self._server.close()
+                return
+            else:
+                raise RuntimeError("wtf 4")
+
+    def _search_remotely(self, conn: _Pipe) -> None:
+        # runs in the search process
+        try:
+            msg, payload = cast(_Command, conn.recv())
+        except (EOFError, OSError):
+            return
+        if msg != "start":
+            return
+        self._board, starting_player = cast(Tuple[List[List[int]], int], payload)
+        self._init_root(starting_player)
+        game_over_flag = threading.Event()
+        explore_flag = threading.Event()
+        threading.Thread(
+            target=self._follow_parent,
+            args=(conn, game_over_flag, explore_flag),
+            daemon=True,
+        ).start()
+        self.manage_tree_forever(game_over_flag, explore_flag)
+
+    def _follow_parent(
+        self,
+        conn: _Pipe,
+        game_over_flag: threading.Event,
+        explore_flag: threading.Event,
+    ) -> None:
+        # the search process's handle_incoming
+        sent: Optional[_BestMove] = None
+        while True:
+            if conn.poll(_CLOCK_TICK):
+                try:
+                    msg, payload = cast(_Command, conn.recv())
+                except (EOFError, OSError):
+                    # the agent's process is gone, so there's no
+                    # game left to search for
+                    msg, payload = "game_over", None
+                if msg == "move":
+                    self._follow_move(cast(_Move, payload))
+                elif msg == "turn":
+                    if payload:
+                        self._start_turn(explore_flag)
+                    else:
+                        self._end_turn(explore_flag)
+                elif msg == "game_over":
+                    game_over_flag.set()
+                    self._notify()
+                    return
+
+            # what choose_move would play rather than best_child,
+            # which can stay None for the whole turn when no move
+            # looks better than the position already is
+            with self._tree_lock:
+                update = (
+                    self._moves_followed,
+                    self.choose_move(),
+                    len(self._root.children),
+                )
+            if update != sent:
+                try:
+                    conn.send(update)
+                except (EOFError, OSError):
+                    # gone, like above
+                    game_over_flag.set()
+                    self._notify()
+                    return
+                sent = update
+
+    def _quick_move(self) -> _Move:
+        # the move with the best score one move ahead, for when the
+        # search process hasn't said anything about this position
+        root = BitBoardNode.root_init(
+            self._board,
+            self._evaluator,
+            self._player_id,
+            self._player_id,
+        )
+        children = cast(List[BitBoardNode], root.expand())
+        return max(children, key=lambda child: child.score).move
+
+    def _hop_chain_on_board(self, move: _Move) -> List[Tuple[int, int]]:
+        source, dest = move
+        num_players = max(max(row) for row in self._board)
+        _, occupied = masks_from_board(self._board, num_players)
+        return moves_from_cell(occupied, CELL_INDEX[source[0]][source[1]])[dest]
+
+    @staticmethod
+    def _notify() -> None:
+        with Agent._wakeup:
+            Agent._wakeup.notify_all()
+
+    def pondering(self) -> bool:
+        # whether the search should carry on while it isn't this
+        # agent's turn
+        return self._ponder and Agent._agents_on_turn == 0
+
+    def _best_move_so_far(self) -> Optional[_Move]:
+        # needs the tree lock
+        best = self._root.best_child
+        return None if best is None else best.move
+
+    def choose_move(self) -> _Move:
+        # the move to answer request_move with. the search may not
+        # have got as far as scoring the root's children in time,
+        # or none of them may have scored above the root's 0, so
+        # this doesn't rely on best_child. needs the tree lock
+        if len(self._root.children) == 0:
+            self.expand_once()
+        best: Optional[_Node] = self._root.best_child
+        if best is None:
+            children: List[_Node] = list(self._root.children.values())
+            best = max(children, key=lambda child: child.score)
+        return best.move
+
     def expand_once(self) -> None:
-        root = self._root
-        pieces = root.pieces[root.current_player_id]
-        for piece in pieces:
-            moves = root.get_moves_from_point(piece)
-            for hop_chain in moves.values():
-                new = GameBoardNode(root, hop_chain)
-                root.children[(piece, hop_chain[-1])] = new
-                new.backprop_max()
+        self._root.expand()
+
+    def tree_memory(self) -> int:
+        # a rough count of the bytes used by the tree under the root
+        return self._root.size() * self._node_type.NODE_BYTES
+
+    def evict_nodes(self) -> bool:
+        # if the tree is over budget, turns the least promising
+        # expanded nodes back into leaves, in eviction_key order,
+        # until it is under again. returns whether anything was
+        # evicted, in which case nodes already handed out may have
+        # died. needs the tree lock
+        if self._max_nodes == 0 or self._root.size() <= self._max_nodes:
+            return False
+
+        expanded: List[_Node] = []
+        stack: List[_Node] = [self._root]
+        while len(stack) > 0:
+            for child in stack.pop().children.values():
+                if len(child.children) > 0:
+                    expanded.append(child)
+                    stack.append(child)
+        expanded.sort(key=self.eviction_key)
+
+        # alive() answers remembered before now can be wrong
+        self._root.epoch += 1
+        target = int(self._max_nodes * _EVICT_TO)
+        for node in expanded:
+            if self._root.size() <= target:
+                break
+            if node.alive(self._root.epoch):
+                self._dead.extend(node.collapse())
+        return True
+
+    def eviction_key(self, node: _Node) -> Tuple[float, int]:
+        # lowest first: the lowest backed up score, and the deepest
+        # of those
+        return (node.score, -node.depth)
+
+    def release_dead_nodes(self, limit: int) -> int:
+        # frees up to limit nodes of the trees cut off by moves,
+        # so it can be done a little at a time between expansions.
+        # needs the tree lock
+        released = 0
+        while len(self._dead) > 0 and released < limit:
+            self._dead.extend(self._dead.pop().release())
+            released += 1
+        return released
 
     @abc.abstractmethod
     def manage_tree_forever(
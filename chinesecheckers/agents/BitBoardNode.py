@@ -0,0 +1,67 @@
+from typing import ClassVar, Iterable, List, Sequence, Tuple, cast
+
+from chinesecheckers.agents.bitboard import (
+    MoveGenerator,
+    iter_cells,
+    masks_from_board,
+    moves_from_cell,
+)
+from chinesecheckers.agents.GameBoardNode import GameBoardNode, _Move, _PossibleMoveList
+from chinesecheckers.agents.zobrist import PIECE_KEYS
+from chinesecheckers.geometry import CELLS, CELL_BITS, CELL_INDEX
+
+
+# same tree node as GameBoardNode, but the board is kept as
+# per player bitmasks (see bitboard.py) instead of a 17x17
+# grid and sets of pieces, so making a child only copies a
+# handful of ints
+class BitBoardNode(GameBoardNode):
+    NODE_BYTES: ClassVar[int] = 650
+
+    __slots__ = ("masks", "occupied", "generator")
+
+    def _load_board(self, board: List[List[int]]) -> None:
+        masks, occupied = masks_from_board(board, self.num_players)
+        self.masks: List[int] = masks
+        self.occupied: int = occupied
+        # shared by the whole tree, which is only ever expanded
+        # by one thread at a time
+        self.generator = MoveGenerator()
+
+    def _copy_board(self, parent: GameBoardNode) -> None:
+        parent = cast(BitBoardNode, parent)
+        self.masks = list(parent.masks)
+        self.occupied = parent.occupied
+        self.generator = parent.generator
+
+    def get_pieces(self, player_id: int) -> Iterable[Tuple[int, int]]:
+        return [CELLS[cell] for cell in iter_cells(self.masks[player_id])]
+
+    def _do_move(self) -> None:
+        source, dest = self.move
+        source_cell = CELL_INDEX[source[0]][source[1]]
+        dest_cell = CELL_INDEX[dest[0]][dest[1]]
+        move_mask = CELL_BITS[source_cell] | CELL_BITS[dest_cell]
+        self.masks[self.current_player_id] ^= move_mask
+        self.occupied ^= move_mask
+        self._update_winner(self.current_player_id, source_cell, dest_cell)
+        keys = PIECE_KEYS[self.current_player_id]
+        self.zobrist_hash ^= keys[source_cell] ^ keys[dest_cell]
+
+    def get_moves_from_point(
+        self,
+        source: Tuple[int, int],
+    ) -> _PossibleMoveList:
+        return moves_from_cell(self.occupied, CELL_INDEX[source[0]][source[1]])
+
+    def generate_moves(self) -> Tuple[Sequence[int], Sequence[int]]:
+        n = self.generator.generate(self.occupied, self.masks[self.current_player_id])
+        return self.generator.sources[:n], self.generator.dests[:n]
+
+    def hop_chain(self, move: _Move) -> List[Tuple[int, int]]:
+        source, dest = move
+        return self.generator.hop_chain(
+            self.occupied,
+            CELL_INDEX[source[0]][source[1]],
+            CELL_INDEX[dest[0]][dest[1]],
+        )
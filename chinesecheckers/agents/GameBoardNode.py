@@ -1,59 +1,130 @@
 import collections
 
-from typing import Callable, Dict, Deque, List, Optional, Set, Tuple
-
-from chinesecheckers import BOARD_SIZE, in_board
-from chinesecheckers.agents import WIN_SLOTS, generate_slot_coords
+from typing import Callable, ClassVar, Dict, Deque, Iterable, List, Optional, Protocol, Sequence, Set, Tuple, Type, TypeVar, cast
+
+from chinesecheckers import BOARD_SIZE
+from chinesecheckers.agents import SLOT_ENDPOINTS
+from chinesecheckers.agents.IncrementalEvaluator import Features, IncrementalEvaluator
+from chinesecheckers.agents.TranspositionTable import TranspositionTable
+from chinesecheckers.agents.zobrist import PIECE_KEYS, TURN_KEYS
+from chinesecheckers.geometry import (
+    CELLS,
+    CELL_INDEX,
+    CELL_SLOT,
+    DISTANCES,
+    JUMPS,
+    NEIGHBOURS,
+    NUM_CELLS,
+    SLOT_SIZE,
+    WIN_SLOTS,
+    count_slot_fill,
+    grid_hop,
+)
 
 _PossibleMoveList = Dict[Tuple[int, int], List[Tuple[int, int]]]
+# (source, destination) of the piece that moved
+_Move = Tuple[Tuple[int, int], Tuple[int, int]]
+_NodeType = TypeVar("_NodeType", bound="GameBoardNode")
+
+# _CORNER_DISTANCES[slot][cell] is how far cell is from the far
+# corner of slot
+_CORNER_DISTANCES: Tuple[Tuple[int, ...], ...] = tuple(
+    DISTANCES[CELL_INDEX[x][y]] for x, y in SLOT_ENDPOINTS
+)
+
+
+class _Child(Protocol):
+    score: float
+    move: _Move
+
+
+_ChildType = TypeVar("_ChildType", bound=_Child)
+
+
+def best_first(
+    children: List[_ChildType],
+    mover: int,
+    agent_player_id: int,
+    num_players: int,
+) -> List[_ChildType]:
+    # the children of a node, best first for mover, the player
+    # making the moves. the agent's own moves go by their scores.
+    # the scores are from the agent's side, so anyone else's go by
+    # how much nearer the move takes the piece to the far corner of
+    # their target slot, the way MaxNAgent orders them
+    if mover == agent_player_id:
+        return sorted(children, key=lambda child: -child.score)
+    slots = cast(Tuple[int, ...], WIN_SLOTS[num_players])
+    corner = _CORNER_DISTANCES[slots[mover-1]]
+    return sorted(
+        children,
+        key=lambda child: (
+            corner[CELL_INDEX[child.move[1][0]][child.move[1][1]]]
+            - corner[CELL_INDEX[child.move[0][0]][child.move[0][1]]]
+        ),
+    )
 
 
 class GameBoardNode(object):
+    # roughly how much memory a node takes up, including its
+    # share of its parent's children dict. measured with
+    # tracemalloc on 6 player trees
+    NODE_BYTES: ClassVar[int] = 8800
+
     __slots__ = (
         "parent",
         "num_players",
-        "hop_chain",
+        "move",
         "state",
         "pieces",
         "evaluator",
         "score",
         "win_statuses",
+        "slot_fill",
         "remaining_players",
         "current_player_id",
         "agent_player_id",
         "children",
         "best_child",
         "pruned",
+        "epoch",
+        "tree_size",
         "depth",
+        "zobrist_hash",
+        "table",
+        "features",
     )
 
     def __init__(
         self,
         parent: Optional["GameBoardNode"] = None,
-        hops_from_parent: List[Tuple[int, int]] = [],
+        move: _Move = ((-1, -1), (-1, -1)),
+        features: Optional[Features] = None,
     ):
         self.parent = parent
-        self.children: Dict[Tuple[Tuple[int, int], Tuple[int, int]], GameBoardNode] = {}
+        self.children: Dict[_Move, GameBoardNode] = {}
         self.best_child: Optional[GameBoardNode] = None
         self.pruned: bool = False
+        # how many nodes there are in the subtree under this one,
+        # including itself
+        self.tree_size: int = 1
 
         if parent is None:
             return
 
         self.depth: int = parent.depth+1
+        self.epoch: int = parent.epoch
 
         self.num_players: int = parent.num_players
 
-        self.hop_chain = hops_from_parent
+        self.move = move
 
-        self.state: List[List[int]] = [
-            list(row) for row in parent.state
-        ]
-        self.pieces: List[Set[Tuple[int, int]]] = [
-            piece_set.copy() for piece_set in parent.pieces
-        ]
+        self._copy_board(parent)
 
-        self.win_statuses: List[bool] = list(parent.win_statuses)
+        # both of these are only replaced, never changed, so
+        # children share them until someone's fill count moves
+        self.win_statuses: Tuple[bool, ...] = parent.win_statuses
+        self.slot_fill: Tuple[int, ...] = parent.slot_fill
         self.remaining_players: int = parent.remaining_players
 
         self.current_player_id: int = parent.current_player_id
@@ -61,169 +132,357 @@ class GameBoardNode(object):
 
         self.agent_player_id: int = parent.agent_player_id
 
-        self._do_move()
+        self.zobrist_hash: int = parent.zobrist_hash
+        self.table: Optional[TranspositionTable] = parent.table
 
-        self.current_player_id = (parent.current_player_id+1) % (self.num_players+1)
-        if self.current_player_id == 0:
-            self.current_player_id = 1
-        while self.win_statuses[self.current_player_id]:
-            self.current_player_id = (self.current_player_id+1) % (self.num_players+1)
-            if self.current_player_id == 0:
-                self.current_player_id = 1
+        self._do_move()
 
-    @staticmethod
+        # once everyone has won there is no one left to move
+        if self.remaining_players > 0:
+            self.current_player_id = self._next_player(parent.current_player_id)
+            self.zobrist_hash ^= (
+                TURN_KEYS[parent.current_player_id]
+                ^ TURN_KEYS[self.current_player_id]
+            )
+
+        # features is passed in when the parent worked out all of
+        # its children's features in one batch
+        self.features: Optional[Features] = parent.features
+        if self.features is not None:
+            evaluator = cast(IncrementalEvaluator, self.evaluator)
+            if features is not None:
+                self.features = features
+            else:
+                self.features = evaluator.update(
+                    self.features,
+                    parent.current_player_id,
+                    move[0],
+                    move[1],
+                    self,
+                )
+            if evaluator.check_updates:
+                evaluator.check(self.features, self)
+        self.score = self.evaluate()
+
+    @classmethod
     def root_init(
+        cls: Type[_NodeType],
         board: List[List[int]],
         evaluator: Callable[["GameBoardNode"], Callable[["GameBoardNode"], float]],
         agent_player_id: int,
         current_player_id: int,
-    ) -> "GameBoardNode":
-        new = GameBoardNode()
+        table: Optional[TranspositionTable] = None,
+    ) -> _NodeType:
+        new = cls()
         num_players = max(max(row) for row in board)
+        slots = WIN_SLOTS[num_players]
+        if slots is None:
+            raise ValueError("bad num players")
         new.num_players = num_players
-        new.state = [list(row) for row in board]
-        new.pieces = [set() for _ in range(num_players+1)]
-        for x in range(BOARD_SIZE):
-            for y in range(BOARD_SIZE):
-                p = board[x][y]
-                if p > 0:
-                    new.pieces[p].add((x, y))
-        new.win_statuses = [False] * (num_players+1)
-        new.remaining_players = num_players
+        new._load_board(board)
+        # slot_fill[i] is how many of player i's pieces are in
+        # the slot they need to fill
+        new.slot_fill = (0,) + tuple(
+            count_slot_fill(
+                slots[i],
+                (CELL_INDEX[x][y] for x, y in new.get_pieces(i+1)),
+            )
+            for i in range(num_players)
+        )
+        new.win_statuses = tuple(fill == SLOT_SIZE for fill in new.slot_fill)
+        new.remaining_players = num_players - sum(new.win_statuses)
         new.score = 0
         new.agent_player_id = agent_player_id
         new.current_player_id = current_player_id
         new.depth = 0
+        new.epoch = 0
+        new.zobrist_hash = TURN_KEYS[current_player_id]
+        for player_id in range(1, num_players+1):
+            for x, y in new.get_pieces(player_id):
+                new.zobrist_hash ^= PIECE_KEYS[player_id][CELL_INDEX[x][y]]
+        new.table = table
         new.evaluator = evaluator(new)
+        new.features = None
+        if isinstance(new.evaluator, IncrementalEvaluator):
+            new.features = new.evaluator.features(new)
         return new
 
+    def _next_player(self, player_id: int) -> int:
+        player_id = (player_id+1) % (self.num_players+1)
+        if player_id == 0:
+            player_id = 1
+        while self.win_statuses[player_id]:
+            player_id = (player_id+1) % (self.num_players+1)
+            if player_id == 0:
+                player_id = 1
+        return player_id
+
+    def _load_board(self, board: List[List[int]]) -> None:
+        self.state: List[List[int]] = [list(row) for row in board]
+        self.pieces: List[Set[Tuple[int, int]]] = [set() for _ in range(self.num_players+1)]
+        for x in range(BOARD_SIZE):
+            for y in range(BOARD_SIZE):
+                p = board[x][y]
+                if p > 0:
+                    self.pieces[p].add((x, y))
+
+    def _copy_board(self, parent: "GameBoardNode") -> None:
+        self.state = [
+            list(row) for row in parent.state
+        ]
+        self.pieces = [
+            piece_set.copy() for piece_set in parent.pieces
+        ]
+
+    def get_pieces(self, player_id: int) -> Iterable[Tuple[int, int]]:
+        return self.pieces[player_id]
+
+    def to_grid(self) -> List[List[int]]:
+        # the position as a 17x17 board like the server sends, to
+        # start another search from
+        grid = [[-1]*BOARD_SIZE for _ in range(BOARD_SIZE)]
+        for x, y in CELLS:
+            grid[x][y] = 0
+        for player_id in range(1, self.num_players+1):
+            for x, y in self.get_pieces(player_id):
+                grid[x][y] = player_id
+        return grid
+
     def _do_move(self) -> None:
-        dest = self.hop_chain[-1]
-        source = self.hop_chain[0]
+        source, dest = self.move
+        source_cell = CELL_INDEX[source[0]][source[1]]
+        dest_cell = CELL_INDEX[dest[0]][dest[1]]
         self.state[dest[0]][dest[1]] = self.state[source[0]][source[1]]
         self.state[source[0]][source[1]] = 0
-        self._check_winners()
+        self._update_winner(self.current_player_id, source_cell, dest_cell)
         self.pieces[self.current_player_id].remove(source)
         self.pieces[self.current_player_id].add(dest)
-        self.score = self.evaluator(self)
-
-    def _check_slot(
+        keys = PIECE_KEYS[self.current_player_id]
+        self.zobrist_hash ^= keys[source_cell] ^ keys[dest_cell]
+
+    def evaluate(self) -> float:
+        if self.features is not None:
+            return cast(IncrementalEvaluator, self.evaluator).score(self.features)
+        if self.table is None:
+            return self.evaluator(self)
+        score = self.table.get_score(self.zobrist_hash)
+        if score is None:
+            score = self.evaluator(self)
+            self.table.store_score(self.zobrist_hash, score)
+        return score
+
+    def _update_winner(
         self,
-        slot_number: int,
         player_id: int,
-    ) -> bool:
-        for x, y in generate_slot_coords(slot_number):
-            if self.state[x][y] != player_id:
-                return False
-        return True
-
-    def _check_winners(self) -> None:
-        slots = WIN_SLOTS[self.num_players]
-        if slots is None:
-            raise ValueError("bad num players")
-
-        for i in range(len(slots)):
-            if not self.win_statuses[i+1] and self._check_slot(slots[i], i+1):
-                self.remaining_players -= 1
-                self.win_statuses[i+1] = True
-
-    def _scan(
-        self,
-        source_x: int, source_y: int,
-        dx: int, dy: int
-    ) -> Optional[Tuple[int, int]]:
-        cur_x = source_x+dx
-        cur_y = source_y+dy
-        if not in_board(cur_x, cur_y):
-            return None
-
-        dist = 1
-        while self.state[cur_x][cur_y] == 0:
-            cur_x += dx
-            cur_y += dy
-            dist += 1
-            if not in_board(cur_x, cur_y):
-                return None
-
-        if self.state[cur_x][cur_y] == -1:
-            return None
-
-        cur_x += dx
-        cur_y += dy
-        if not in_board(cur_x, cur_y) or self.state[cur_x][cur_y] != 0:
-            return None
-
-        dist -= 1
-        while dist > 0:
-            cur_x += dx
-            cur_y += dy
-            dist -= 1
-            if not in_board(cur_x, cur_y) or self.state[cur_x][cur_y] != 0:
-                return None
-
-        return (cur_x, cur_y)
-
-    _DELTAS = (
-        (1, 0),
-        (-1, 0),
-        (0, 1),
-        (0, -1),
-        (-1, 1),
-        (1, -1)
-    )
+        source_cell: int,
+        dest_cell: int,
+    ) -> None:
+        # only the player who moved can have gained or lost a
+        # piece in their slot, so theirs is the only count to fix
+        target = WIN_SLOTS[self.num_players][player_id-1]  # type: ignore
+        change = (CELL_SLOT[dest_cell] == target) - (CELL_SLOT[source_cell] == target)
+        if change == 0:
+            return
+        fill = self.slot_fill[player_id] + change
+        self.slot_fill = self.slot_fill[:player_id] + (fill,) + self.slot_fill[player_id+1:]
+        if fill == SLOT_SIZE:
+            self.remaining_players -= 1
+            self.win_statuses = (
+                self.win_statuses[:player_id] + (True,) + self.win_statuses[player_id+1:]
+            )
 
     def get_moves_from_point(
         self,
         source: Tuple[int, int],
     ) -> _PossibleMoveList:
         possible: _PossibleMoveList = {}
-        visited = [[False]*BOARD_SIZE for _ in range(BOARD_SIZE)]
-        q: Deque[Tuple[int, int]] = collections.deque()
-        q.append(source)
-        visited[source[0]][source[1]] = True
+        visited = [False]*NUM_CELLS
+        q: Deque[int] = collections.deque()
+        source_cell = CELL_INDEX[source[0]][source[1]]
+        q.append(source_cell)
+        visited[source_cell] = True
 
         original = self.state[source[0]][source[1]]
         self.state[source[0]][source[1]] = 0
 
-        for direction in GameBoardNode._DELTAS:
-            x = source[0]+direction[0]
-            y = source[1]+direction[1]
-            if in_board(x, y) and self.state[x][y] == 0:
+        for cell in NEIGHBOURS[source_cell]:
+            x, y = CELLS[cell]
+            if self.state[x][y] == 0:
                 possible[(x, y)] = [source, (x, y)]
 
         while len(q) > 0:
             p = q.popleft()
 
-            for direction in GameBoardNode._DELTAS:
-                maybe_dest = self._scan(p[0], p[1], direction[0], direction[1])
-                if maybe_dest is not None and not visited[maybe_dest[0]][maybe_dest[1]]:
-                    visited[maybe_dest[0]][maybe_dest[1]] = True
+            for jumps in JUMPS[p]:
+                maybe_dest = grid_hop(self.state, jumps)
+                if maybe_dest != -1 and not visited[maybe_dest]:
+                    visited[maybe_dest] = True
                     q.append(maybe_dest)
-                    if p == source:
-                        possible[maybe_dest] = [source, maybe_dest]
+                    if p == source_cell:
+                        possible[CELLS[maybe_dest]] = [source, CELLS[maybe_dest]]
                     else:
-                        new = list(possible[p])
-                        new.append(maybe_dest)
-                        possible[maybe_dest] = new
+                        new = list(possible[CELLS[p]])
+                        new.append(CELLS[maybe_dest])
+                        possible[CELLS[maybe_dest]] = new
 
         self.state[source[0]][source[1]] = original
         return possible
 
-    def prune(self) -> int:
+    def expand(
+        self,
+        table: Optional[TranspositionTable] = None,
+        ordered: bool = False,
+    ) -> Optional[List["GameBoardNode"]]:
+        # passing the table merges this node into any other node with
+        # the same position that was already expanded, returning None.
+        # ordered gives the children best first, see best_first
+        if len(self.children) > 0:
+            # already expanded, so the search carries on below it
+            children = list(self.children.values())
+        else:
+            children = self._expand_new(table)
+            if children is None:
+                return None
+        if ordered:
+            return best_first(children, self.current_player_id, self.agent_player_id, self.num_players)
+        return children
+
+    def _expand_new(
+        self,
+        table: Optional[TranspositionTable],
+    ) -> Optional[List["GameBoardNode"]]:
+        if self.remaining_players == 0:
+            # the game is over, so there are no moves
+            return []
+        if table is not None and not table.claim_expansion(self.zobrist_hash):
+            return None
+
+        sources, dests = self.moves_to_expand(table)
+        features = self.features_of_children(sources, dests)
+        new_children: List[GameBoardNode] = []
+        for i in range(len(sources)):
+            move = (CELLS[sources[i]], CELLS[dests[i]])
+            new = type(self)(self, move, None if features is None else features[i])
+            self.children[move] = new
+            new.backprop_max()
+            new_children.append(new)
+        self._add_to_tree_size(len(new_children))
+        return new_children
+
+    def _add_to_tree_size(self, count: int) -> None:
+        node: Optional[GameBoardNode] = self
+        while node is not None:
+            node.tree_size += count
+            node = node.parent
+
+    def generate_moves(self) -> Tuple[Sequence[int], Sequence[int]]:
+        # the source and destination cells of every move the
+        # current player can make
+        sources: List[int] = []
+        dests: List[int] = []
+        for piece in self.get_pieces(self.current_player_id):
+            source_cell = CELL_INDEX[piece[0]][piece[1]]
+            for x, y in self.get_moves_from_point(piece):
+                sources.append(source_cell)
+                dests.append(CELL_INDEX[x][y])
+        return sources, dests
+
+    def moves_to_expand(
+        self,
+        table: Optional[TranspositionTable],
+    ) -> Tuple[Sequence[int], Sequence[int]]:
+        # generate_moves, unless another agent sharing the table's
+        # PositionCache already generated this position's moves
+        if table is None or not table.shared:
+            return self.generate_moves()
+        moves = table.get_moves(self.zobrist_hash)
+        if moves is None:
+            sources, dests = self.generate_moves()
+            moves = (tuple(sources), tuple(dests))
+            table.store_moves(self.zobrist_hash, moves)
+        return moves
+
+    def hop_chain(self, move: _Move) -> List[Tuple[int, int]]:
+        # every cell the piece passes through in one of the
+        # current player's moves, for sending to the server
+        return self.get_moves_from_point(move[0])[move[1]]
+
+    def features_of_children(
+        self,
+        sources: Sequence[int],
+        dests: Sequence[int],
+    ) -> Optional[List[Features]]:
+        # the features of the child for each move, from one batched
+        # update, or None if the evaluator can't do that
+        if self.features is None:
+            return None
+        return cast(IncrementalEvaluator, self.evaluator).update_many(
+            self.features,
+            self.current_player_id,
+            sources,
+            dests,
+            self,
+        )
+
+    def reroot(
+        self,
+        move: _Move,
+    ) -> "GameBoardNode":
+        new_root = self.children.pop(move)
+        new_root.parent = None
+        new_root.score = 0
+        new_root.epoch = self.epoch+1
+        # the rest of the old tree is found to be dead by alive()
+        # as the search comes across it, not by visiting it now
+        self.pruned = True
+        return new_root
+
+    def alive(self, epoch: int) -> bool:
+        # whether this node is still in the tree under the root of
+        # the given epoch. every node on the way up remembers the
+        # answer, so checking a whole frontier after a reroot takes
+        # about one step per node
+        path: List[GameBoardNode] = []
+        node = self
+        while not node.pruned and node.epoch != epoch and node.parent is not None:
+            path.append(node)
+            node = node.parent
+        alive = not node.pruned and node.epoch == epoch
+        for node in path:
+            if alive:
+                node.epoch = epoch
+            else:
+                node.pruned = True
+        return alive
+
+    def collapse(self) -> List["GameBoardNode"]:
+        # turn an expanded node back into a leaf to free memory,
+        # returning the children it had. they are marked pruned, but
+        # anything below them that alive() already vouched for this
+        # epoch is only caught once the root's epoch is moved on
+        children = list(self.children.values())
+        for child in children:
+            child.pruned = True
+        self._add_to_tree_size(1-self.tree_size)
+        self.children = {}
+        self.best_child = None
+        return children
+
+    def release(self) -> List["GameBoardNode"]:
+        # drop a dead node's references to its children, returning
+        # them. a node and its parent refer to each other, so dead
+        # subtrees are otherwise only freed by the cycle collector
+        children = list(self.children.values())
+        self.children = {}
+        self.best_child = None
         self.pruned = True
-        pruned = 1
-        for child in self.children.values():
-            pruned += child.prune()
-        return pruned
+        return children
 
     def size(self) -> int:
-        size = 1
-        for child in self.children.values():
-            size += child.size()
-        return size
+        return self.tree_size
 
     def __str__(self) -> str:
-        return str((self.hop_chain[0], self.hop_chain[-1]))
+        return str(self.move)
 
     def backprop_max(self) -> None:
         if self.parent is None:
@@ -0,0 +1,68 @@
+import abc
+
+from typing import TYPE_CHECKING, ClassVar, List, Optional, Sequence, Tuple
+
+if TYPE_CHECKING:
+    from chinesecheckers.agents.GameBoardNode import GameBoardNode
+
+# whatever an evaluator needs to keep per node to score its
+# children without looking at the whole board again
+Features = Tuple[int, ...]
+
+
+# an evaluator that can score a node from its parent's features
+# and the move that was made, in O(1). calling it on a node
+# still does the full computation, so anything that treats it
+# as a plain Callable[[GameBoardNode], float] keeps working
+class IncrementalEvaluator(abc.ABC):
+    __slots__ = ()
+
+    # set to compare every incremental update against a full
+    # recomputation, which is slow but catches drift right away
+    check_updates: ClassVar[bool] = False
+
+    @abc.abstractmethod
+    def features(self, node: "GameBoardNode") -> Features:
+        pass
+
+    @abc.abstractmethod
+    def update(
+        self,
+        features: Features,
+        player_id: int,
+        source: Tuple[int, int],
+        dest: Tuple[int, int],
+        node: "GameBoardNode",
+    ) -> Features:
+        # node already has the move applied, for the rare update
+        # that has to fall back to features(node)
+        pass
+
+    def update_many(
+        self,
+        features: Features,
+        player_id: int,
+        source_cells: Sequence[int],
+        dest_cells: Sequence[int],
+        node: "GameBoardNode",
+    ) -> Optional[List[Features]]:
+        # the features of every child of node at once, where child
+        # k moves the piece on source_cells[k] to dest_cells[k].
+        # unlike update, none of the moves are applied to node.
+        # returning None means the children have to be updated one
+        # at a time instead
+        return None
+
+    @abc.abstractmethod
+    def score(self, features: Features) -> float:
+        pass
+
+    def __call__(self, node: "GameBoardNode") -> float:
+        return self.score(self.features(node))
+
+    def check(self, features: Features, node: "GameBoardNode") -> None:
+        expected = self.features(node)
+        if self.score(features) != self.score(expected):
+            raise RuntimeError(
+                f"incremental evaluator drifted: {features} != {expected}"
+            )
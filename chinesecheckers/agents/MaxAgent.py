@@ -1,25 +1,73 @@
-import collections
 import threading
 import time
 
-from typing import Deque
+from typing import Callable, List, Optional, Type, Union, cast
 
-from chinesecheckers.agents.Agent import Agent
+from chinesecheckers.agents.Agent import Agent, _Node
 from chinesecheckers.agents.GameBoardNode import GameBoardNode
+from chinesecheckers.agents.MoveNode import MoveNode
+from chinesecheckers.agents.PositionCache import PositionCache
+from chinesecheckers.agents.frontiers import FifoFrontier, Frontier
+
+# how many dead nodes are taken apart per expanded node while
+# searching, and per step while there is nothing else to do
+_RELEASE_PER_EXPANSION = 256
+_RELEASE_WHILE_IDLE = 4096
 
 
 class MaxAgent(Agent):
-    __slots__ = ("d", "pruned", "popped")
+    __slots__ = ("_frontier", "d", "pruned", "popped", "merged")
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        evaluator: Callable[[GameBoardNode], Callable[[GameBoardNode], float]],
+        node_type: Union[Type[GameBoardNode], Type[MoveNode]] = GameBoardNode,
+        table_size: int = 0,
+        max_nodes: int = 0,
+        max_tree_bytes: int = 0,
+        ponder: Optional[bool] = None,
+        move_time: float = 3,
+        safety_margin: float = 0.25,
+        search_process: bool = False,
+        shared_cache: Optional[PositionCache] = None,
+        frontier: Callable[[], Frontier] = FifoFrontier,
+        binary_protocol: bool = False,
+    ) -> None:
+        super().__init__(
+            host,
+            port,
+            evaluator,
+            node_type,
+            table_size,
+            max_nodes,
+            max_tree_bytes,
+            ponder,
+            move_time,
+            safety_margin,
+            search_process,
+            shared_cache,
+            binary_protocol=binary_protocol,
+        )
+        # makes the frontier, which decides what order the tree is
+        # expanded in. see frontiers.py
+        self._frontier = frontier
 
     def manage_tree_forever(
         self,
         game_over_flag: threading.Event,
         explore_flag: threading.Event,
     ) -> None:
-        d: Deque[GameBoardNode] = collections.deque()
+        d = self._frontier()
         self.d = d
         self.pruned = 0
         self.popped = 0
+        # nodes whose position was already expanded elsewhere in
+        # the tree. they get another chance when the root moves,
+        # since the copy that was expanded may have been pruned
+        merged: List[_Node] = []
+        self.merged = merged
 
         # log_thread = threading.Thread(
         #     target=self.periodically_log,
@@ -27,38 +75,80 @@ class MaxAgent(Agent):
         # )
         # log_thread.start()
 
-        while self._root is None:
-            pass
+        d.push(self._root)
+        searched_root = self._root
+        # the frontier can run dry, when a beam has dropped every
+        # node it hasn't expanded. the search then starts over from
+        # the root, once, so the beam gets to pick again knowing
+        # what the root is now. if it runs dry again there is
+        # nothing more to do until the root moves
+        restarted = False
+        exhausted = False
+
+        def searching() -> bool:
+            return (explore_flag.is_set() or self.pondering()) and not exhausted
 
-        d.append(self._root)
+        def has_work() -> bool:
+            return (
+                game_over_flag.is_set()
+                or searching()
+                or searched_root is not self._root
+                or (len(self._dead) > 0 and Agent._agents_on_turn == 0)
+            )
 
         while True:
-            if explore_flag.is_set():
-                if len(d) == 0:
-                    print("ROOT APPEND")
-                    d.append(self._root)
-                node = d.popleft()
-
-                if not node.pruned:
-                    self.popped += 1
-                    pieces = node.pieces[node.current_player_id]
-                    for piece in pieces:
-                        moves = node.get_moves_from_point(piece)
-                        for hop_chain in moves.values():
-                            new = GameBoardNode(node, hop_chain)
-                            node.children[(piece, hop_chain[-1])] = new
-                            new.backprop_max()
-                            d.append(new)
+            with Agent._wakeup:
+                Agent._wakeup.wait_for(has_work)
+            if game_over_flag.is_set():
+                return
+
+            with self._tree_lock:
+                # checked under the lock, so the root can't move
+                # between here and the expansion
+                if searched_root is not self._root:
+                    searched_root = self._root
+                    self._drop_dead_nodes()
+                    d.restart()
+                    for node in merged:
+                        d.push(node)
+                    merged.clear()
+                    restarted = False
+                    exhausted = False
+
+                popped: Optional[_Node] = None
+                if searching():
+                    popped = d.pop()
+                    if popped is None and not restarted:
+                        restarted = True
+                        d.restart()
+                        popped = self._root
+                    exhausted = popped is None
+
+                if popped is not None:
+                    node = popped
+                    if node.alive(searched_root.epoch):
+                        self.popped += 1
+                        children = node.expand(self._table, d.ORDERED)
+                        if children is None:
+                            merged.append(node)
+                        else:
+                            d.push_children(cast(List[_Node], children))
+                        if self.evict_nodes():
+                            self._drop_dead_nodes()
+                    else:
+                        self.pruned += 1
+                    self.release_dead_nodes(_RELEASE_PER_EXPANSION)
                 else:
-                    self.pruned += 1
-            else:
-                if game_over_flag.is_set():
-                    return
-                if len(d) > 0:
-                    print("CLEAR")
-                    d.clear()
+                    self.release_dead_nodes(_RELEASE_WHILE_IDLE)
+
+    def _drop_dead_nodes(self) -> None:
+        # let go of every queued node that is no longer under the
+        # root, so it is freed now instead of when it gets popped
+        epoch = self._root.epoch
+        self.d.retain(lambda node: node.alive(epoch))
+        self.merged[:] = [node for node in self.merged if node.alive(epoch)]
 
     def periodically_log(self) -> None:
         while True:
             time.sleep(1)
-            print("log", len(self.d), self.popped, self.d[-1].depth-self._root.depth if len(self.d) > 1 else 0, sorted([(str(c), round(1000/c.score)) for c in self._root.children.values()], key=lambda x: x[1], reverse=True))
+            print("log", len(self.d), self.popped, sorted([(str(c), round(1000/c.score)) for c in self._root.children.values()], key=lambda x: x[1], reverse=True))
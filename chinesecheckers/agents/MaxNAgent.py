@@ -0,0 +1,375 @@
+import math
+import threading
+
+from typing import Callable, ClassVar, Dict, List, Optional, Sequence, Tuple, Type, Union, cast
+
+from chinesecheckers.agents import SLOT_ENDPOINTS
+from chinesecheckers.agents.Agent import Agent, _Node
+from chinesecheckers.agents.GameBoardNode import GameBoardNode
+from chinesecheckers.agents.IncrementalEvaluator import Features, IncrementalEvaluator
+from chinesecheckers.agents.MoveNode import MoveNode
+from chinesecheckers.agents.SearchBoard import SearchBoard
+from chinesecheckers.agents.evaluators import player_evaluators
+from chinesecheckers.geometry import CELLS, CELL_INDEX, DISTANCES, NUM_CELLS, WIN_SLOTS
+
+# how many nodes are searched between checks for a new root,
+# the end of the game, or another agent's turn starting
+_CHECK_EVERY = 512
+# iterative deepening stops here even if there is time left
+_MAX_DEPTH = 32
+# dead trees here are only ever a root and its children, so
+# they are all taken apart before each search
+_RELEASE_PER_SEARCH = 1 << 16
+
+# one score per player, by player id. index 0 is unused
+_Scores = List[float]
+# (source cell, destination cell)
+_CellMove = Tuple[int, int]
+
+
+class _SearchAborted(Exception):
+    pass
+
+
+# searches depth first on its own copy of the root's SearchBoard,
+# one ply deeper each time, instead of growing a tree best first.
+# the only tree it keeps is the root and its children, which is
+# all handle_incoming needs to follow moves and answer with
+# best_child.
+#
+# max^n assumes every player picks the move that is best for
+# them, by the evaluator seen from their side. the paranoid
+# variant assumes every other player is out to minimize this
+# agent's score instead, which makes it a two player game that
+# alpha-beta can prune. max^n can't be pruned that way since the
+# scores don't add up to a constant, so it only stops early at a
+# move that wins the game for the player making it
+class MaxNAgent(Agent):
+    PARANOID: ClassVar[bool] = False
+
+    __slots__ = (
+        "_player_evaluators",
+        "_advance",
+        "_best_moves",
+        "_searching",
+        "_next_check",
+        "_game_over_flag",
+        "_explore_flag",
+        "nodes",
+        "depth",
+    )
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        evaluator: Callable[[GameBoardNode], Callable[[GameBoardNode], float]],
+        node_type: Union[Type[GameBoardNode], Type[MoveNode]] = MoveNode,
+        table_size: int = 0,
+        max_nodes: int = 0,
+        max_tree_bytes: int = 0,
+        ponder: Optional[bool] = None,
+        move_time: float = 3,
+        safety_margin: float = 0.25,
+        search_process: bool = False,
+        binary_protocol: bool = False,
+    ) -> None:
+        # the search runs on a SearchBoard, which the root of a
+        # MoveNode tree already keeps up to date
+        if node_type is not MoveNode:
+            raise ValueError("max^n searches need a tree of MoveNodes")
+        super().__init__(
+            host,
+            port,
+            evaluator,
+            node_type,
+            table_size,
+            max_nodes,
+            max_tree_bytes,
+            ponder,
+            move_time,
+            safety_margin,
+            search_process,
+            binary_protocol=binary_protocol,
+        )
+        # _player_evaluators[i] scores a position for player i
+        self._player_evaluators: List[Callable[[GameBoardNode], float]] = []
+        # _advance[i][cell] is how far cell is from the far corner
+        # of player i's target slot, for ordering moves
+        self._advance: List[List[int]] = []
+        # the best move found at each position by the last
+        # iteration, which the next one searches first
+        self._best_moves: Dict[int, _CellMove] = {}
+        self._searching: Optional[_Node] = None
+        self._next_check = 0
+        self.nodes = 0
+        self.depth = 0
+
+    def manage_tree_forever(
+        self,
+        game_over_flag: threading.Event,
+        explore_flag: threading.Event,
+    ) -> None:
+        self._game_over_flag = game_over_flag
+        self._explore_flag = explore_flag
+
+        def has_work() -> bool:
+            return game_over_flag.is_set() or (
+                self._root is not self._searching
+                and (explore_flag.is_set() or self.pondering())
+            )
+
+        while True:
+            with Agent._wakeup:
+                Agent._wakeup.wait_for(has_work)
+            if game_over_flag.is_set():
+                return
+
+            with self._tree_lock:
+                root = cast(MoveNode, self._root)
+                self._searching = root
+                self.release_dead_nodes(_RELEASE_PER_SEARCH)
+                if len(root.children) == 0:
+                    root.expand()
+                assert root.board is not None
+                board = root.board.copy()
+
+            if len(self._player_evaluators) == 0:
+                self._init_players(board)
+            try:
+                self._iterative_deepening(root, board)
+            except _SearchAborted:
+                pass
+
+    def _init_players(self, board: SearchBoard) -> None:
+        slots = cast(Tuple[int, ...], WIN_SLOTS[board.num_players])
+        self._player_evaluators = player_evaluators(self._evaluator, board)
+        self._advance.append([0] * NUM_CELLS)
+        for player_id in range(1, board.num_players+1):
+            x, y = SLOT_ENDPOINTS[slots[player_id-1]]
+            self._advance.append(list(DISTANCES[CELL_INDEX[x][y]]))
+
+    def _iterative_deepening(self, root: MoveNode, board: SearchBoard) -> None:
+        self._best_moves.clear()
+        self.nodes = 0
+        self._next_check = _CHECK_EVERY
+        features = self._root_features(board)
+        if not self.PARANOID:
+            # max^n keeps everyone's features itself
+            board.features = None
+        for depth in range(1, _MAX_DEPTH+1):
+            if self.PARANOID:
+                self._paranoid(board, depth, -math.inf, math.inf)
+            else:
+                self._maxn(board, depth, features)
+            best = self._best_moves.get(board.zobrist_hash)
+            if best is None:
+                # nothing to move, or the game is over
+                return
+            with self._tree_lock:
+                if self._root is not root:
+                    return
+                root.best_child = root.children[(CELLS[best[0]], CELLS[best[1]])]
+            self.depth = depth
+            print("searched to depth", depth, "in", self.nodes, "nodes")
+
+    def _check(self) -> None:
+        # stops the search if it is no longer wanted, and waits while
+        # it is only paused for another agent's turn
+        self._next_check = self.nodes + _CHECK_EVERY
+        with Agent._wakeup:
+            Agent._wakeup.wait_for(lambda: (
+                self._game_over_flag.is_set()
+                or self._root is not self._searching
+                or self._explore_flag.is_set()
+                or self.pondering()
+            ))
+        if self._game_over_flag.is_set() or self._root is not self._searching:
+            raise _SearchAborted()
+
+    def _is_leaf(self, board: SearchBoard, depth: int) -> bool:
+        return (
+            depth == 0
+            or board.remaining_players == 0
+            or board.win_statuses[self._player_id]
+        )
+
+    def _order(
+        self,
+        board: SearchBoard,
+        sources: Sequence[int],
+        dests: Sequence[int],
+    ) -> List[int]:
+        # the last iteration's best move first, then the moves that
+        # take the piece furthest towards the target slot
+        advance = self._advance[board.current_player_id]
+        order = sorted(
+            range(len(sources)),
+            key=lambda i: advance[dests[i]] - advance[sources[i]],
+        )
+        best = self._best_moves.get(board.zobrist_hash)
+        if best is not None:
+            for k, i in enumerate(order):
+                if sources[i] == best[0] and dests[i] == best[1]:
+                    order.insert(0, order.pop(k))
+                    break
+        return order
+
+    def _paranoid(
+        self,
+        board: SearchBoard,
+        depth: int,
+        alpha: float,
+        beta: float,
+    ) -> float:
+        self.nodes += 1
+        if self.nodes >= self._next_check:
+            self._check()
+        if self._is_leaf(board, depth):
+            return board.evaluate()
+        sources, dests = board.generate_moves()
+        if len(sources) == 0:
+            return board.evaluate()
+        maximizing = board.current_player_id == self._player_id
+
+        if depth == 1 and board.features is not None:
+            # the children are leaves, so score them all in one batch
+            # without making their moves
+            features = board.features_of_children(sources, dests)
+            if features is not None:
+                self.nodes += len(sources)
+                evaluator = cast(IncrementalEvaluator, board.evaluator)
+                scores = [evaluator.score(f) for f in features]
+                pick = max if maximizing else min
+                best = pick(range(len(scores)), key=scores.__getitem__)
+                self._best_moves[board.zobrist_hash] = (sources[best], dests[best])
+                return scores[best]
+
+        best_value = -math.inf if maximizing else math.inf
+        best = -1
+        for i in self._order(board, sources, dests):
+            board.make_move((CELLS[sources[i]], CELLS[dests[i]]))
+            value = self._paranoid(board, depth-1, alpha, beta)
+            board.unmake_move()
+            if maximizing:
+                if value > best_value:
+                    best_value = value
+                    best = i
+                alpha = max(alpha, value)
+            else:
+                if value < best_value:
+                    best_value = value
+                    best = i
+                beta = min(beta, value)
+            if alpha >= beta:
+                break
+        self._best_moves[board.zobrist_hash] = (sources[best], dests[best])
+        return best_value
+
+    def _root_features(self, board: SearchBoard) -> Optional[List[Features]]:
+        # every player's features, if every evaluator is incremental
+        features: List[Features] = [()]
+        for evaluator in self._player_evaluators[1:]:
+            if not isinstance(evaluator, IncrementalEvaluator):
+                return None
+            features.append(evaluator.features(board))
+        return features
+
+    def _scores(
+        self,
+        board: SearchBoard,
+        features: Optional[List[Features]],
+    ) -> _Scores:
+        if features is None:
+            return [0.0] + [
+                evaluator(board) for evaluator in self._player_evaluators[1:]
+            ]
+        return [0.0] + [
+            cast(IncrementalEvaluator, self._player_evaluators[i]).score(features[i])
+            for i in range(1, len(features))
+        ]
+
+    def _maxn(
+        self,
+        board: SearchBoard,
+        depth: int,
+        features: Optional[List[Features]],
+    ) -> _Scores:
+        self.nodes += 1
+        if self.nodes >= self._next_check:
+            self._check()
+        if self._is_leaf(board, depth):
+            return self._scores(board, features)
+        sources, dests = board.generate_moves()
+        if len(sources) == 0:
+            return self._scores(board, features)
+        mover = board.current_player_id
+
+        if depth == 1 and features is not None:
+            return self._maxn_frontier(board, sources, dests, features)
+
+        best_scores: Optional[_Scores] = None
+        best = -1
+        for i in self._order(board, sources, dests):
+            source = CELLS[sources[i]]
+            dest = CELLS[dests[i]]
+            board.make_move((source, dest))
+            child_features = None
+            if features is not None:
+                child_features = [features[0]] + [
+                    cast(IncrementalEvaluator, self._player_evaluators[p]).update(
+                        features[p], mover, source, dest, board,
+                    )
+                    for p in range(1, len(features))
+                ]
+            scores = self._maxn(board, depth-1, child_features)
+            won = board.win_statuses[mover]
+            board.unmake_move()
+            if best_scores is None or scores[mover] > best_scores[mover]:
+                best_scores = scores
+                best = i
+            if won:
+                # nothing can be better for the mover than winning
+                break
+        self._best_moves[board.zobrist_hash] = (sources[best], dests[best])
+        return cast(_Scores, best_scores)
+
+    def _maxn_frontier(
+        self,
+        board: SearchBoard,
+        sources: Sequence[int],
+        dests: Sequence[int],
+        features: List[Features],
+    ) -> _Scores:
+        # the children are leaves and the mover takes whichever is
+        # best for them, so only the mover's score is needed for
+        # all of them, and everyone else's only for the one picked
+        mover = board.current_player_id
+        evaluators = cast(List[IncrementalEvaluator], self._player_evaluators)
+        children = evaluators[mover].update_many(features[mover], mover, sources, dests, board)
+        if children is None:
+            children = []
+            for i in range(len(sources)):
+                source = CELLS[sources[i]]
+                dest = CELLS[dests[i]]
+                board.make_move((source, dest))
+                children.append(evaluators[mover].update(features[mover], mover, source, dest, board))
+                board.unmake_move()
+        self.nodes += len(sources)
+        mover_scores = [evaluators[mover].score(f) for f in children]
+        best = max(range(len(mover_scores)), key=mover_scores.__getitem__)
+        self._best_moves[board.zobrist_hash] = (sources[best], dests[best])
+
+        source = CELLS[sources[best]]
+        dest = CELLS[dests[best]]
+        board.make_move((source, dest))
+        child_features = [features[0]] + [
+            evaluators[p].update(features[p], mover, source, dest, board)
+            for p in range(1, len(features))
+        ]
+        board.unmake_move()
+        return self._scores(board, child_features)
+
+
+class ParanoidAgent(MaxNAgent):
+    PARANOID = True
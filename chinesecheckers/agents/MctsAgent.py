@@ -0,0 +1,201 @@
+import multiprocessing
+import multiprocessing.pool
+import threading
+import time
+
+from typing import Callable, Dict, List, Optional, Tuple, Type, Union, cast
+
+from chinesecheckers.agents.Agent import _PROCESSES, Agent, _Node
+from chinesecheckers.agents.BitBoardNode import BitBoardNode
+from chinesecheckers.agents.GameBoardNode import GameBoardNode, _Move
+from chinesecheckers.agents.MctsNode import MCTS_NODE_TYPES, MctsNode
+from chinesecheckers.agents.MctsSearch import MctsSearch
+from chinesecheckers.agents.MoveNode import MoveNode
+from chinesecheckers.agents.evaluators import player_evaluators
+
+# see MaxAgent
+_RELEASE_PER_ITERATION = 256
+_RELEASE_WHILE_IDLE = 4096
+# how long a pool worker searches before reporting back. short
+# enough that the last reports are in before the move deadline
+_SLICE_SECONDS = 0.25
+
+# the search a pool worker keeps between slices, and the key of
+# the position it is for
+_worker_search: Optional[Tuple[int, MctsSearch]] = None
+
+
+def _search_slice(
+    board: List[List[int]],
+    agent_player_id: int,
+    current_player_id: int,
+    evaluator: Callable[[GameBoardNode], Callable[[GameBoardNode], float]],
+    node_type: Type[MctsNode],
+    key: int,
+    seconds: float,
+    max_nodes: int,
+) -> Dict[_Move, int]:
+    # runs in a pool worker. searches the position for a while on
+    # the worker's own tree, which is kept for the next slice of
+    # the same position, and returns how many more times each
+    # move from the root was visited than before
+    global _worker_search
+    if _worker_search is None or _worker_search[0] != key:
+        root = node_type.root_init(board, evaluator, agent_player_id, current_player_id)
+        search = MctsSearch(player_evaluators(evaluator, root), max_nodes)
+        search.set_root(root)
+        _worker_search = (key, search)
+    search = _worker_search[1]
+
+    before = search.root_visits()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        search.iterate()
+    return {
+        move: visits - before.get(move, 0)
+        for move, visits in search.root_visits().items()
+    }
+
+
+# plays by MctsSearch. with workers, it is also root parallel:
+# on this agent's turn each pool worker grows an independent tree
+# from the same root, and the visits they give each move are added
+# to this tree's when picking one. the workers don't share the
+# GIL with the agents, so one agent can keep many cores busy
+class MctsAgent(Agent):
+    __slots__ = (
+        "_search",
+        "_workers",
+        "_pool",
+        "_pending",
+        "_parallel_visits",
+    )
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        evaluator: Callable[[GameBoardNode], Callable[[GameBoardNode], float]],
+        node_type: Union[Type[GameBoardNode], Type[MoveNode]] = BitBoardNode,
+        table_size: int = 0,
+        max_nodes: int = 0,
+        max_tree_bytes: int = 0,
+        ponder: Optional[bool] = None,
+        move_time: float = 3,
+        safety_margin: float = 0.25,
+        search_process: bool = False,
+        workers: int = 0,
+        binary_protocol: bool = False,
+    ) -> None:
+        if not issubclass(node_type, GameBoardNode) or node_type not in MCTS_NODE_TYPES:
+            raise ValueError("mcts needs nodes that keep their own position")
+        if table_size > 0:
+            # a transposition table would merge nodes away, but their
+            # statistics only make sense in one place in the tree
+            raise ValueError("mcts can't use a transposition table")
+        super().__init__(
+            host,
+            port,
+            evaluator,
+            MCTS_NODE_TYPES[node_type],
+            0,
+            max_nodes,
+            max_tree_bytes,
+            ponder,
+            move_time,
+            safety_margin,
+            search_process,
+            binary_protocol=binary_protocol,
+        )
+        self._search: Optional[MctsSearch] = None
+        self._workers = workers
+        # started by the search, which may be in another process
+        self._pool: Optional[multiprocessing.pool.Pool] = None
+        # slices handed to the pool, with the root they search from
+        self._pending: List[Tuple[_Node, multiprocessing.pool.AsyncResult[Dict[_Move, int]]]] = []
+        # what the pool's slices of the current root add up to
+        self._parallel_visits: Dict[_Move, int] = {}
+
+    def manage_tree_forever(
+        self,
+        game_over_flag: threading.Event,
+        explore_flag: threading.Event,
+    ) -> None:
+        def has_work() -> bool:
+            return (
+                game_over_flag.is_set()
+                or explore_flag.is_set()
+                or self.pondering()
+                or (len(self._dead) > 0 and Agent._agents_on_turn == 0)
+            )
+
+        if self._workers > 0:
+            self._pool = _PROCESSES.Pool(self._workers)
+
+        while True:
+            with Agent._wakeup:
+                Agent._wakeup.wait_for(has_work)
+            if game_over_flag.is_set():
+                if self._pool is not None:
+                    self._pool.terminate()
+                return
+
+            with self._tree_lock:
+                if explore_flag.is_set() or self.pondering():
+                    root = cast(MctsNode, self._root)
+                    if self._search is None:
+                        self._search = MctsSearch(player_evaluators(self._evaluator, root))
+                    if self._search.root is not root:
+                        self._search.set_root(root)
+                        self._parallel_visits.clear()
+                    # before the iteration, so it can't collapse
+                    # anything on the path it takes
+                    self.evict_nodes()
+                    self._search.iterate()
+                    if self._pool is not None:
+                        self._run_pool(root, explore_flag.is_set())
+                    self._pick_best_child(root)
+                    self.release_dead_nodes(_RELEASE_PER_ITERATION)
+                else:
+                    self.release_dead_nodes(_RELEASE_WHILE_IDLE)
+
+    def eviction_key(self, node: _Node) -> Tuple[float, int]:
+        # the least visited first, and the deepest of those
+        return (cast(MctsNode, node).visits, -node.depth)
+
+    def _run_pool(self, root: MctsNode, my_turn: bool) -> None:
+        # collects the slices that are done, and keeps every worker
+        # busy while it is this agent's turn. needs the tree lock
+        pool = cast(multiprocessing.pool.Pool, self._pool)
+        still_pending = []
+        for searched, result in self._pending:
+            if not result.ready():
+                still_pending.append((searched, result))
+            elif searched is root and result.successful():
+                for move, visits in result.get().items():
+                    self._parallel_visits[move] = self._parallel_visits.get(move, 0) + visits
+        self._pending = still_pending
+
+        # on other players' turns the workers would mostly be
+        # guessing at what they will do
+        while my_turn and len(self._pending) < self._workers:
+            self._pending.append((root, pool.apply_async(_search_slice, (
+                # not self._board, which is only kept up to date in
+                # the process talking to the server
+                root.to_grid(),
+                self._player_id,
+                root.current_player_id,
+                self._evaluator,
+                self._node_type,
+                root.zobrist_hash,
+                _SLICE_SECONDS,
+                self._max_nodes,
+            ))))
+
+    def _pick_best_child(self, root: MctsNode) -> None:
+        if len(root.children) == 0:
+            return
+        root.best_child = max(
+            root.mcts_children(),
+            key=lambda child: child.visits + self._parallel_visits.get(child.move, 0),
+        )
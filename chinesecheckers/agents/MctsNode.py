@@ -0,0 +1,57 @@
+from typing import Dict, List, Optional, Type, cast
+
+from chinesecheckers.agents.BitBoardNode import BitBoardNode
+from chinesecheckers.agents.GameBoardNode import GameBoardNode, _Move
+from chinesecheckers.agents.IncrementalEvaluator import Features
+
+# what the playout statistics add to a node: their two slots,
+# the float reward, and MctsNode's __dict__ and __weakref__
+# pointers
+_STATS_BYTES = 56
+
+
+# a tree node with the playout statistics MctsSearch keeps, so
+# the other searches' nodes don't pay for them. a GameBoardNode
+# and a BitBoardNode can't both be based on a class with slots of
+# its own, so this one leaves out __slots__ and GridMctsNode and
+# BitBoardMctsNode, the ones to make trees of, hold the slots.
+# those are found before __dict__, so no node ever gets a dict
+class MctsNode(GameBoardNode):
+    # reward is summed from the point of view of the player who
+    # made the move here
+    visits: int
+    reward: float
+
+    def __init__(
+        self,
+        parent: Optional["MctsNode"] = None,
+        move: _Move = ((-1, -1), (-1, -1)),
+        features: Optional[Features] = None,
+    ):
+        self.visits = 0
+        self.reward = 0.0
+        super().__init__(parent, move, features)
+
+    def mcts_children(self) -> List["MctsNode"]:
+        # every child of an MctsNode is one too
+        return cast(List[MctsNode], list(self.children.values()))
+
+
+class GridMctsNode(MctsNode):
+    NODE_BYTES = GameBoardNode.NODE_BYTES + _STATS_BYTES
+
+    __slots__ = ("visits", "reward")
+
+
+class BitBoardMctsNode(BitBoardNode, MctsNode):
+    NODE_BYTES = BitBoardNode.NODE_BYTES + _STATS_BYTES
+
+    __slots__ = ("visits", "reward")
+
+
+# MCTS_NODE_TYPES[node_type] is the node MctsAgent makes its tree
+# of when asked for node_type
+MCTS_NODE_TYPES: Dict[Type[GameBoardNode], Type[MctsNode]] = {
+    GameBoardNode: GridMctsNode,
+    BitBoardNode: BitBoardMctsNode,
+}
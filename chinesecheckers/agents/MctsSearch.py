@@ -0,0 +1,232 @@
+import math
+import random
+
+from typing import Callable, Dict, List, Optional, Tuple, cast
+
+from chinesecheckers.agents.GameBoardNode import GameBoardNode, _Move
+from chinesecheckers.agents.MctsNode import MctsNode
+from chinesecheckers.agents.IncrementalEvaluator import Features, IncrementalEvaluator
+from chinesecheckers.agents.SearchBoard import SearchBoard
+from chinesecheckers.geometry import CELLS
+
+# how much UCT favours trying less visited moves over the best
+# looking one
+_EXPLORATION = 0.3
+# a leaf is expanded once it has been played out from this many
+# times, counting the visit its prior is worth
+_EXPAND_AFTER = 2
+# playouts are this many moves per player still in the game
+_PLAYOUT_ROUNDS = 2
+# chance of a playout move being random instead of greedy
+_PLAYOUT_EPSILON = 0.1
+# how sharply a change in a player's score turns into a reward.
+# a score 10% better than at the root is worth about 0.62
+_REWARD_SCALE = 5
+
+
+# monte carlo tree search over a tree of MctsNodes. each
+# iteration walks down the tree by UCT, expanding the leaf it
+# ends up at if it has been visited enough, then plays the game
+# on from there for a few moves with every player greedily taking
+# their best looking move, and adds how well each player did to
+# the nodes on the way back up. the tree is only grown where the
+# playouts say it is worth it, so it gets much deeper than a full
+# width search when there are six players with sixty moves each.
+#
+# rewards are per player, since any of them could be choosing at
+# a node. a player's reward is how their score at the end of a
+# playout compares to their score at the root, squashed into
+# (0, 1). new children start with one visit worth of that reward
+# for the position right after their move, so the playouts go to
+# the moves that look best for whoever is making them first
+class MctsSearch(object):
+    __slots__ = (
+        "player_evaluators",
+        "incremental",
+        "max_nodes",
+        "root",
+        "board",
+        "root_scores",
+        "iterations",
+    )
+
+    def __init__(
+        self,
+        player_evaluators: List[Callable[[GameBoardNode], float]],
+        max_nodes: int = 0,
+    ) -> None:
+        self.player_evaluators = player_evaluators
+        # whether every player's evaluator is incremental, in which
+        # case moves are scored in batches
+        self.incremental = all(
+            isinstance(evaluator, IncrementalEvaluator)
+            for evaluator in player_evaluators[1:]
+        )
+        # leaves stop being expanded once the tree has this many
+        # nodes, or 0 for no limit. for trees that nothing evicts from
+        self.max_nodes = max_nodes
+        self.root: Optional[MctsNode] = None
+        # the position at the root, that every iteration makes its
+        # moves on and then unmakes again
+        self.board: Optional[SearchBoard] = None
+        self.root_scores: List[float] = []
+        self.iterations = 0
+
+    def set_root(self, root: MctsNode) -> None:
+        # search from root on, keeping whatever statistics the tree
+        # under it already has
+        board = SearchBoard.from_node(root)
+        # the board's own features are only ever the agent's, and
+        # playouts keep everyone's
+        board.features = None
+        self.root = root
+        self.board = board
+        self.root_scores = [0.0] + [
+            evaluator(board) for evaluator in self.player_evaluators[1:]
+        ]
+        self.iterations = 0
+
+    def root_visits(self) -> Dict[_Move, int]:
+        assert self.root is not None
+        return {child.move: child.visits for child in self.root.mcts_children()}
+
+    def _reward(self, player_id: int, score: float) -> float:
+        root_score = self.root_scores[player_id]
+        if root_score <= 0:
+            return 0.5
+        return 0.5 + 0.5*math.tanh(_REWARD_SCALE*(score/root_score - 1))
+
+    def _select(self, node: MctsNode) -> MctsNode:
+        log_visits = math.log(max(node.visits, 1))
+        best: Optional[MctsNode] = None
+        best_value = -math.inf
+        for child in node.mcts_children():
+            if child.visits == 0:
+                # made by expand() rather than _expand, as the
+                # agent's expand_once does, so there's no prior to
+                # go on. tried before anything that has one
+                return child
+            value = (
+                child.reward/child.visits
+                + _EXPLORATION*math.sqrt(log_visits/child.visits)
+            )
+            if value > best_value:
+                best = child
+                best_value = value
+        return cast(MctsNode, best)
+
+    def iterate(self) -> None:
+        root = self.root
+        board = self.board
+        assert root is not None and board is not None
+        path = [root]
+        node = root
+        while len(node.children) > 0:
+            node = self._select(node)
+            board.make_move(node.move)
+            path.append(node)
+
+        if (
+            node.remaining_players > 0
+            and (node is root or node.visits >= _EXPAND_AFTER)
+            and (self.max_nodes == 0 or root.size() < self.max_nodes)
+        ):
+            self._expand(node, board)
+            if len(node.children) > 0:
+                node = self._select(node)
+                board.make_move(node.move)
+                path.append(node)
+
+        rewards, playout_moves = self._playout(board)
+        for _ in range(len(path)-1 + playout_moves):
+            board.unmake_move()
+
+        root.visits += 1
+        for i in range(1, len(path)):
+            path[i].visits += 1
+            path[i].reward += rewards[path[i-1].current_player_id]
+        self.iterations += 1
+
+    def _expand(self, node: MctsNode, board: SearchBoard) -> None:
+        # board is in node's position
+        if node.expand() is None:
+            return
+        children = node.mcts_children()
+        if len(children) == 0:
+            return
+        mover = node.current_player_id
+        evaluator = self.player_evaluators[mover]
+        if self.incremental:
+            incremental = cast(IncrementalEvaluator, evaluator)
+            sources, dests = board.generate_moves()
+            features = incremental.update_many(
+                incremental.features(board),
+                mover,
+                sources,
+                dests,
+                board,
+            )
+            if features is not None:
+                for i in range(len(sources)):
+                    child = cast(MctsNode, node.children[(CELLS[sources[i]], CELLS[dests[i]])])
+                    child.visits = 1
+                    child.reward = self._reward(mover, incremental.score(features[i]))
+                return
+
+        for child in children:
+            board.make_move(child.move)
+            score = evaluator(board)
+            board.unmake_move()
+            child.visits = 1
+            child.reward = self._reward(mover, score)
+
+    def _playout(self, board: SearchBoard) -> Tuple[List[float], int]:
+        # plays greedily from board's position, returning every
+        # player's reward and how many moves were made
+        evaluators = self.player_evaluators
+        features: List[Features] = []
+        if self.incremental:
+            features = [()] + [
+                cast(IncrementalEvaluator, evaluator).features(board)
+                for evaluator in evaluators[1:]
+            ]
+
+        moves = 0
+        for _ in range(_PLAYOUT_ROUNDS*board.remaining_players):
+            if board.remaining_players == 0:
+                break
+            sources, dests = board.generate_moves()
+            if len(sources) == 0:
+                break
+            mover = board.current_player_id
+            pick = random.randrange(len(sources))
+            children: Optional[List[Features]] = None
+            if self.incremental and random.random() >= _PLAYOUT_EPSILON:
+                evaluator = cast(IncrementalEvaluator, evaluators[mover])
+                children = evaluator.update_many(features[mover], mover, sources, dests, board)
+                if children is not None:
+                    scores = [evaluator.score(f) for f in children]
+                    pick = max(range(len(scores)), key=scores.__getitem__)
+
+            source = CELLS[sources[pick]]
+            dest = CELLS[dests[pick]]
+            board.make_move((source, dest))
+            moves += 1
+            if self.incremental:
+                for player_id in range(1, len(features)):
+                    if children is not None and player_id == mover:
+                        features[player_id] = children[pick]
+                    else:
+                        features[player_id] = cast(
+                            IncrementalEvaluator,
+                            evaluators[player_id],
+                        ).update(features[player_id], mover, source, dest, board)
+
+        if self.incremental:
+            scores = [0.0] + [
+                cast(IncrementalEvaluator, evaluators[i]).score(features[i])
+                for i in range(1, len(features))
+            ]
+        else:
+            scores = [0.0] + [evaluator(board) for evaluator in evaluators[1:]]
+        return [self._reward(i, scores[i]) for i in range(len(scores))], moves
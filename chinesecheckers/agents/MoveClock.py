@@ -0,0 +1,64 @@
+import time
+
+from typing import Optional
+
+from chinesecheckers.agents.GameBoardNode import _Move
+
+
+# decides when an agent has searched long enough to answer a
+# request_move. there is a hard deadline per move, which is the
+# time allowed less a margin for the answer to get to the server,
+# and the search stops sooner if there is only one legal move or
+# the best move has not changed for a while
+class MoveClock(object):
+    __slots__ = (
+        "move_time",
+        "safety_margin",
+        "stable_fraction",
+        "_started",
+        "_deadline",
+        "_best_move",
+        "_best_since",
+    )
+
+    def __init__(
+        self,
+        move_time: float = 3,
+        safety_margin: float = 0.25,
+        stable_fraction: float = 0.25,
+    ) -> None:
+        self.move_time = move_time
+        self.safety_margin = safety_margin
+        # the best move counts as settled once it has stayed the
+        # same for this fraction of the time allowed
+        self.stable_fraction = stable_fraction
+        self._started = 0.0
+        self._deadline = 0.0
+        self._best_move: Optional[_Move] = None
+        self._best_since = 0.0
+
+    def start(self, best_move: Optional[_Move]) -> None:
+        self._started = time.monotonic()
+        self._deadline = self._started + max(0.0, self.move_time-self.safety_margin)
+        self._best_move = best_move
+        self._best_since = self._started
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self._started
+
+    def time_left(self) -> float:
+        return max(0.0, self._deadline-time.monotonic())
+
+    def done(self, num_moves: int, best_move: Optional[_Move]) -> bool:
+        # num_moves is 0 while the root hasn't been expanded yet
+        now = time.monotonic()
+        if now >= self._deadline or num_moves == 1:
+            return True
+        if best_move != self._best_move:
+            self._best_move = best_move
+            self._best_since = now
+            return False
+        return (
+            best_move is not None
+            and now-self._best_since >= (self._deadline-self._started)*self.stable_fraction
+        )
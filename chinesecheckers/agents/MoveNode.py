@@ -0,0 +1,209 @@
+from typing import Callable, ClassVar, Dict, List, Optional, Tuple, cast
+
+from chinesecheckers.agents.GameBoardNode import GameBoardNode, _Move, best_first
+from chinesecheckers.agents.IncrementalEvaluator import IncrementalEvaluator
+from chinesecheckers.agents.SearchBoard import SearchBoard
+from chinesecheckers.agents.TranspositionTable import TranspositionTable
+from chinesecheckers.geometry import CELLS
+
+
+# a tree node that only remembers the move that led to it and
+# its score. the position is rebuilt when it is needed by making
+# the moves from the root on the root's SearchBoard, then they
+# are unmade again, so no node ever owns a copy of the board
+class MoveNode(object):
+    # see GameBoardNode.NODE_BYTES
+    NODE_BYTES: ClassVar[int] = 300
+
+    __slots__ = (
+        "parent",
+        "move",
+        "score",
+        "children",
+        "best_child",
+        "pruned",
+        "epoch",
+        "tree_size",
+        "depth",
+        "board",
+    )
+
+    def __init__(
+        self,
+        parent: Optional["MoveNode"] = None,
+        move: _Move = ((-1, -1), (-1, -1)),
+        score: float = 0,
+    ):
+        self.parent = parent
+        self.move = move
+        self.score = score
+        self.children: Dict[_Move, MoveNode] = {}
+        self.best_child: Optional[MoveNode] = None
+        self.pruned: bool = False
+        self.epoch: int = 0 if parent is None else parent.epoch
+        self.tree_size: int = 1
+        self.depth: int = 0 if parent is None else parent.depth+1
+        # only set on the root
+        self.board: Optional[SearchBoard] = None
+
+    @staticmethod
+    def root_init(
+        board: List[List[int]],
+        evaluator: Callable[[GameBoardNode], Callable[[GameBoardNode], float]],
+        agent_player_id: int,
+        current_player_id: int,
+        table: Optional[TranspositionTable] = None,
+    ) -> "MoveNode":
+        new = MoveNode()
+        new.board = SearchBoard.root_init(
+            board,
+            evaluator,
+            agent_player_id,
+            current_player_id,
+            table,
+        )
+        return new
+
+    def _enter(self) -> Tuple[SearchBoard, int]:
+        # make the moves from the root down to this node, returning
+        # the board and how many moves have to be unmade afterwards
+        path: List[_Move] = []
+        node = self
+        while node.parent is not None:
+            path.append(node.move)
+            node = node.parent
+
+        board = node.board
+        assert board is not None
+        for move in reversed(path):
+            board.make_move(move)
+        return board, len(path)
+
+    def expand(
+        self,
+        table: Optional[TranspositionTable] = None,
+        ordered: bool = False,
+    ) -> Optional[List["MoveNode"]]:
+        # see GameBoardNode.expand
+        children: Optional[List[MoveNode]] = None
+        if len(self.children) > 0:
+            children = list(self.children.values())
+            if not ordered:
+                # no need for the board at all
+                return children
+        board, depth = self._enter()
+        if children is None:
+            children = self._expand_new(board, table)
+        if children is not None and ordered:
+            children = best_first(children, board.current_player_id, board.agent_player_id, board.num_players)
+        for _ in range(depth):
+            board.unmake_move()
+        return children
+
+    def _expand_new(
+        self,
+        board: SearchBoard,
+        table: Optional[TranspositionTable],
+    ) -> Optional[List["MoveNode"]]:
+        if board.remaining_players == 0:
+            return []
+        if table is not None and not table.claim_expansion(board.zobrist_hash):
+            return None
+
+        sources, dests = board.moves_to_expand(table)
+        # with a batch of features the children can be scored
+        # without making their moves on the board at all
+        features = board.features_of_children(sources, dests)
+        evaluator = cast(IncrementalEvaluator, board.evaluator)
+        new_children: List[MoveNode] = []
+        for i in range(len(sources)):
+            move = (CELLS[sources[i]], CELLS[dests[i]])
+            if features is None:
+                board.make_move(move)
+                score = board.evaluate()
+                board.unmake_move()
+            else:
+                score = evaluator.score(features[i])
+                if evaluator.check_updates:
+                    board.make_move(move)
+                    evaluator.check(features[i], board)
+                    board.unmake_move()
+            new = MoveNode(self, move, score)
+            self.children[move] = new
+            new.backprop_max()
+            new_children.append(new)
+
+        self._add_to_tree_size(len(new_children))
+        return new_children
+
+    def _add_to_tree_size(self, count: int) -> None:
+        node: Optional[MoveNode] = self
+        while node is not None:
+            node.tree_size += count
+            node = node.parent
+
+    def reroot(self, move: _Move) -> "MoveNode":
+        board = self.board
+        assert board is not None
+        new_root = self.children.pop(move)
+        board.make_move(new_root.move)
+        board.commit_moves()
+        new_root.board = board
+        new_root.parent = None
+        new_root.score = 0
+        new_root.epoch = self.epoch+1
+        self.board = None
+        # see GameBoardNode.reroot
+        self.pruned = True
+        return new_root
+
+    def hop_chain(self, move: _Move) -> List[Tuple[int, int]]:
+        assert self.board is not None
+        return self.board.hop_chain(move)
+
+    def alive(self, epoch: int) -> bool:
+        # see GameBoardNode.alive
+        path: List[MoveNode] = []
+        node = self
+        while not node.pruned and node.epoch != epoch and node.parent is not None:
+            path.append(node)
+            node = node.parent
+        alive = not node.pruned and node.epoch == epoch
+        for node in path:
+            if alive:
+                node.epoch = epoch
+            else:
+                node.pruned = True
+        return alive
+
+    def collapse(self) -> List["MoveNode"]:
+        # see GameBoardNode.collapse
+        children = list(self.children.values())
+        for child in children:
+            child.pruned = True
+        self._add_to_tree_size(1-self.tree_size)
+        self.children = {}
+        self.best_child = None
+        return children
+
+    def release(self) -> List["MoveNode"]:
+        # see GameBoardNode.release
+        children = list(self.children.values())
+        self.children = {}
+        self.best_child = None
+        self.pruned = True
+        return children
+
+    def size(self) -> int:
+        return self.tree_size
+
+    def __str__(self) -> str:
+        return str(self.move)
+
+    def backprop_max(self) -> None:
+        if self.parent is None:
+            return
+        if self.score > self.parent.score:
+            self.parent.score = self.score
+            self.parent.best_child = self
+            self.parent.backprop_max()
@@ -0,0 +1,78 @@
+import collections
+import threading
+
+from typing import Optional, Tuple
+
+# (sources, destinations) of every move the player to move has,
+# as cells, like generate_moves gives them
+_Moves = Tuple[Tuple[int, ...], Tuple[int, ...]]
+
+# roughly how much memory an entry takes up: the entry, its key
+# and the two tuples, then a pointer in each tuple per move. the
+# cells are small ints, which python shares. measured with
+# tracemalloc, like GameBoardNode.NODE_BYTES
+_ENTRY_BYTES = 200
+_MOVE_BYTES = 16
+
+
+def _entry_bytes(moves: _Moves) -> int:
+    return _ENTRY_BYTES + _MOVE_BYTES*len(moves[0])
+
+
+# the moves of positions, shared by every agent in the process
+# that is given one. the agents all see the same board, so the
+# positions one of them expands are often ones the others reach
+# too. a zobrist hash includes whose turn it is, so a position's
+# moves are the same whoever is searching it, unlike its score.
+# unlike a TranspositionTable it is used from many threads at
+# once, so everything goes through a lock. bounded by an
+# estimate of the bytes it takes up: once full, the least
+# recently used entries are thrown away first. only agents that
+# search in this process can share one, see Agent.play_remote
+class PositionCache(object):
+    __slots__ = ("_entries", "_max_bytes", "_bytes", "_lock", "hits", "misses")
+
+    def __init__(self, max_bytes: int = 64 << 20) -> None:
+        self._entries: collections.OrderedDict[int, _Moves] = collections.OrderedDict()
+        self._max_bytes = max_bytes
+        # estimated with _entry_bytes
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # for every agent together. each agent's own are kept
+        # by its TranspositionTable
+        self.hits = 0
+        self.misses = 0
+
+    def get_moves(self, key: int) -> Optional[_Moves]:
+        with self._lock:
+            moves = self._entries.get(key)
+            if moves is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return moves
+
+    def store_moves(self, key: int, moves: _Moves) -> None:
+        size = _entry_bytes(moves)
+        if size > self._max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= _entry_bytes(old)
+            while self._bytes + size > self._max_bytes:
+                self._bytes -= _entry_bytes(self._entries.popitem(last=False)[1])
+            self._entries[key] = moves
+            self._bytes += size
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __str__(self) -> str:
+        with self._lock:
+            return (
+                f"{len(self._entries)} positions, "
+                f"about {self._bytes >> 20} MiB, "
+                f"{self.hits}/{self.hits + self.misses} hits"
+            )
@@ -0,0 +1,109 @@
+from typing import List, Optional, Tuple, cast
+
+from chinesecheckers.agents.BitBoardNode import BitBoardNode
+from chinesecheckers.agents.bitboard import MoveGenerator, masks_from_board
+from chinesecheckers.agents.GameBoardNode import GameBoardNode, _Move
+from chinesecheckers.agents.IncrementalEvaluator import Features, IncrementalEvaluator
+from chinesecheckers.agents.zobrist import PIECE_KEYS, TURN_KEYS
+from chinesecheckers.geometry import CELL_BITS, CELL_INDEX
+
+# (move mask, player who moved, win statuses before, slot
+# fill counts before, remaining players before, hash before,
+# features before)
+_Undo = Tuple[int, int, Tuple[bool, ...], Tuple[int, ...], int, int, Optional[Features]]
+
+
+# a BitBoardNode that is never copied. moves are made and
+# unmade on it in place while walking a tree of MoveNodes,
+# so one of these is all the board state a search needs
+class SearchBoard(BitBoardNode):
+    __slots__ = ("_undo",)
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._undo: List[_Undo] = []
+
+    def make_move(self, move: _Move) -> None:
+        source, dest = move
+        player_id = self.current_player_id
+        source_cell = CELL_INDEX[source[0]][source[1]]
+        dest_cell = CELL_INDEX[dest[0]][dest[1]]
+        move_mask = CELL_BITS[source_cell] | CELL_BITS[dest_cell]
+        self._undo.append((
+            move_mask,
+            player_id,
+            self.win_statuses,
+            self.slot_fill,
+            self.remaining_players,
+            self.zobrist_hash,
+            self.features,
+        ))
+        self.masks[player_id] ^= move_mask
+        self.occupied ^= move_mask
+        self._update_winner(player_id, source_cell, dest_cell)
+        keys = PIECE_KEYS[player_id]
+        self.zobrist_hash ^= keys[source_cell] ^ keys[dest_cell]
+        if self.remaining_players > 0:
+            self.current_player_id = self._next_player(player_id)
+            self.zobrist_hash ^= TURN_KEYS[player_id] ^ TURN_KEYS[self.current_player_id]
+
+        if self.features is not None:
+            evaluator = cast(IncrementalEvaluator, self.evaluator)
+            self.features = evaluator.update(self.features, player_id, source, dest, self)
+            if evaluator.check_updates:
+                evaluator.check(self.features, self)
+
+    def unmake_move(self) -> None:
+        (
+            move_mask,
+            player_id,
+            win_statuses,
+            slot_fill,
+            remaining_players,
+            zobrist_hash,
+            features,
+        ) = self._undo.pop()
+        self.masks[player_id] ^= move_mask
+        self.occupied ^= move_mask
+        self.win_statuses = win_statuses
+        self.slot_fill = slot_fill
+        self.remaining_players = remaining_players
+        self.current_player_id = player_id
+        self.zobrist_hash = zobrist_hash
+        self.features = features
+
+    @staticmethod
+    def from_node(node: GameBoardNode) -> "SearchBoard":
+        # a board in the same position as node with nothing to undo,
+        # that can be searched by another thread. it gets its own
+        # move generator, and no transposition table since those
+        # aren't thread safe
+        new = SearchBoard()
+        new.num_players = node.num_players
+        if isinstance(node, BitBoardNode):
+            new.masks = list(node.masks)
+            new.occupied = node.occupied
+        else:
+            new.masks, new.occupied = masks_from_board(node.state, node.num_players)
+        new.generator = MoveGenerator()
+        new.win_statuses = node.win_statuses
+        new.slot_fill = node.slot_fill
+        new.remaining_players = node.remaining_players
+        new.current_player_id = node.current_player_id
+        new.agent_player_id = node.agent_player_id
+        new.zobrist_hash = node.zobrist_hash
+        new.table = None
+        new.evaluator = node.evaluator
+        new.features = node.features
+        new.score = node.score
+        new.depth = 0
+        new.epoch = 0
+        return new
+
+    def copy(self) -> "SearchBoard":
+        return SearchBoard.from_node(self)
+
+    def commit_moves(self) -> None:
+        # the moves made so far are now part of the game, so
+        # they will never be unmade
+        self._undo.clear()
@@ -0,0 +1,121 @@
+import collections
+
+from typing import Optional
+
+from chinesecheckers.agents.PositionCache import PositionCache, _Moves
+
+
+class _Entry(object):
+    __slots__ = ("score", "expanded")
+
+    def __init__(self, score: Optional[float], expanded: int) -> None:
+        self.score = score
+        # generation the position was last expanded in
+        self.expanded = expanded
+
+
+# remembers positions by zobrist hash, so a position that is
+# reached again through a different move order reuses the
+# evaluation of the first one, and only one copy of it gets
+# expanded per search. bounded: once full, the oldest entries
+# are thrown away first
+class TranspositionTable(object):
+    __slots__ = (
+        "_entries",
+        "_max_entries",
+        "_generation",
+        "hits",
+        "misses",
+        "merges",
+        "_shared",
+        "shared_hits",
+        "shared_misses",
+    )
+
+    def __init__(self, max_entries: int = 1 << 18) -> None:
+        self._entries: collections.OrderedDict[int, _Entry] = collections.OrderedDict()
+        self._max_entries = max_entries
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.merges = 0
+        self._shared: Optional[PositionCache] = None
+        self.shared_hits = 0
+        self.shared_misses = 0
+
+    def share(self, cache: PositionCache) -> None:
+        # the moves of positions this agent expands are looked up
+        # in cache, and the ones it has to generate go there too
+        self._shared = cache
+
+    @property
+    def shared(self) -> bool:
+        return self._shared is not None
+
+    def get_moves(self, key: int) -> Optional[_Moves]:
+        if self._shared is None:
+            return None
+        moves = self._shared.get_moves(key)
+        if moves is None:
+            self.shared_misses += 1
+        else:
+            self.shared_hits += 1
+        return moves
+
+    def store_moves(self, key: int, moves: _Moves) -> None:
+        if self._shared is not None:
+            self._shared.store_moves(key, moves)
+
+    def _add(self, key: int, entry: _Entry) -> None:
+        if len(self._entries) >= self._max_entries:
+            self._entries.popitem(last=False)
+        self._entries[key] = entry
+
+    def get_score(self, key: int) -> Optional[float]:
+        entry = self._entries.get(key)
+        if entry is None or entry.score is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry.score
+
+    def store_score(self, key: int, score: float) -> None:
+        entry = self._entries.get(key)
+        if entry is None:
+            self._add(key, _Entry(score, -1))
+        else:
+            entry.score = score
+
+    def claim_expansion(self, key: int) -> bool:
+        # false if another node with the same position was already
+        # expanded in this generation, in which case this one is
+        # merged into it and should not be expanded again
+        entry = self._entries.get(key)
+        if entry is None:
+            self._add(key, _Entry(None, self._generation))
+            return True
+        if entry.expanded == self._generation:
+            self.merges += 1
+            return False
+        entry.expanded = self._generation
+        return True
+
+    def new_generation(self) -> None:
+        # called when the root moves. nodes expanded under the old
+        # root may have been pruned, so their positions are fair
+        # game again
+        self._generation += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __str__(self) -> str:
+        lookups = self.hits + self.misses
+        description = (
+            f"{len(self._entries)} positions, {self.hits}/{lookups} hits, "
+            f"{self.merges} merged"
+        )
+        if self._shared is not None:
+            shared_lookups = self.shared_hits + self.shared_misses
+            description += f", {self.shared_hits}/{shared_lookups} shared hits"
+        return description
@@ -0,0 +1,247 @@
+import abc
+
+from typing import Callable, ClassVar, Dict, Iterable, List, Optional, Sequence, Tuple, Type, cast
+
+import numpy  # type: ignore
+
+from chinesecheckers.agents import WIN_SLOTS
+from chinesecheckers.agents.GameBoardNode import GameBoardNode
+from chinesecheckers.agents.IncrementalEvaluator import Features, IncrementalEvaluator
+from chinesecheckers.agents.evaluators import _FIRST_UNFILLED, _SLOT_DISTANCES, _TARGET_BITS, evaluators
+from chinesecheckers.geometry import CELL_INDEX, SLOT_SIZE
+
+# what a BatchEvaluator can ask to be given about each position,
+# as an int64 array with a row per position. OWN_PIECES is the
+# cells of the pieces of the player being scored for,
+# OTHER_PIECES the cells of everyone else's, a block of SLOT_SIZE
+# per player in order of player id. the cells within a block are
+# in no order. scores come back as a float64 array
+OWN_PIECES = "own"
+OTHER_PIECES = "others"
+
+
+# the other way to write an evaluator: instead of scoring one
+# node at a time, score a whole batch of positions at once with
+# numpy, given only the arrays named in NEEDS. made the same way
+# an evaluator factory is, from the root it is for
+class BatchEvaluator(abc.ABC):
+    __slots__ = ("agent_player_id",)
+
+    NEEDS: ClassVar[Tuple[str, ...]] = ()
+
+    def __init__(self, root: GameBoardNode) -> None:
+        self.agent_player_id = root.agent_player_id
+
+    @abc.abstractmethod
+    def score_batch(
+        self,
+        positions: Dict[str, "numpy.ndarray[Tuple[int, int], numpy.dtype[numpy.int64]]"],
+        count: int,
+    ) -> "numpy.ndarray[Tuple[int], numpy.dtype[numpy.float64]]":
+        # one score per position, for count positions
+        pass
+
+
+# the features _BatchAdapter keeps: the cells of the pieces the
+# evaluator needs, with the position's score alongside them.
+# compared and hashed as just the cells
+class _ScoredCells(Tuple[int, ...]):
+    # None until something asks for it
+    score: Optional[float]
+
+    def __new__(cls, cells: Iterable[int], score: Optional[float] = None) -> "_ScoredCells":
+        new = super().__new__(cls, cells)
+        new.score = score
+        return new
+
+
+# runs a BatchEvaluator as an IncrementalEvaluator, so every
+# search can use one. a node's children get their cells by
+# moving one piece in the parent's, and are all scored in one
+# batch by update_many. update leaves the score to be worked out
+# if it is asked for, since walking a make/unmake tree updates
+# every node on the way and only the leaves get scored
+class _BatchAdapter(IncrementalEvaluator):
+    __slots__ = ("_batch", "_offsets", "_width", "_own", "_others")
+
+    def __init__(self, batch: BatchEvaluator, root: GameBoardNode) -> None:
+        self._batch = batch
+        # _offsets[player_id] is where the player's block of cells
+        # starts, or -1 if they aren't kept
+        self._offsets = [-1] * (root.num_players+1)
+        offset = 0
+        self._own = OWN_PIECES in batch.NEEDS
+        if self._own:
+            self._offsets[batch.agent_player_id] = offset
+            offset += SLOT_SIZE
+        self._others = OTHER_PIECES in batch.NEEDS
+        if self._others:
+            for player_id in range(1, root.num_players+1):
+                if player_id != batch.agent_player_id:
+                    self._offsets[player_id] = offset
+                    offset += SLOT_SIZE
+        self._width = offset
+
+    def _score_all(self, rows: Sequence[Sequence[int]]) -> List[float]:
+        cells = numpy.array(rows, dtype=numpy.int64).reshape(len(rows), self._width)
+        positions: Dict[str, "numpy.ndarray[Tuple[int, int], numpy.dtype[numpy.int64]]"] = {}
+        if self._own:
+            positions[OWN_PIECES] = cells[:, :SLOT_SIZE]
+        if self._others:
+            positions[OTHER_PIECES] = cells[:, SLOT_SIZE*self._own:]
+        scores = self._batch.score_batch(positions, len(rows))
+        return cast(List[float], numpy.asarray(scores, dtype=numpy.float64).tolist())
+
+    def _moved(
+        self,
+        features: Features,
+        player_id: int,
+        source_cell: int,
+        dest_cell: int,
+    ) -> List[int]:
+        start = self._offsets[player_id]
+        row = list(features)
+        row[row.index(source_cell, start, start+SLOT_SIZE)] = dest_cell
+        return row
+
+    def features(self, node: GameBoardNode) -> Features:
+        row = [0] * self._width
+        for player_id in range(1, len(self._offsets)):
+            start = self._offsets[player_id]
+            if start >= 0:
+                row[start:start+SLOT_SIZE] = [
+                    CELL_INDEX[x][y] for x, y in node.get_pieces(player_id)
+                ]
+        return _ScoredCells(row, self._score_all([row])[0])
+
+    def update(
+        self,
+        features: Features,
+        player_id: int,
+        source: Tuple[int, int],
+        dest: Tuple[int, int],
+        node: GameBoardNode,
+    ) -> Features:
+        if self._width == 0:
+            # nothing to tell positions apart by, so every node gets
+            # features of its own, to be scored on their own
+            return _ScoredCells(())
+        if self._offsets[player_id] < 0:
+            return features
+        return _ScoredCells(self._moved(
+            features,
+            player_id,
+            CELL_INDEX[source[0]][source[1]],
+            CELL_INDEX[dest[0]][dest[1]],
+        ))
+
+    def update_many(
+        self,
+        features: Features,
+        player_id: int,
+        source_cells: Sequence[int],
+        dest_cells: Sequence[int],
+        node: GameBoardNode,
+    ) -> Optional[List[Features]]:
+        if self._width == 0:
+            return [
+                _ScoredCells((), score)
+                for score in self._score_all([()] * len(source_cells))
+            ]
+        if self._offsets[player_id] < 0:
+            # the children all score the same as node, so it is
+            # scored once for all of them
+            self.score(features)
+            return [features] * len(source_cells)
+        if len(source_cells) == 0:
+            return []
+        rows = [
+            self._moved(features, player_id, source_cell, dest_cell)
+            for source_cell, dest_cell in zip(source_cells, dest_cells)
+        ]
+        return [
+            _ScoredCells(row, score)
+            for row, score in zip(rows, self._score_all(rows))
+        ]
+
+    def score(self, features: Features) -> float:
+        cells = cast(_ScoredCells, features)
+        if cells.score is None:
+            # the same cells always score the same, so the score is
+            # kept for whoever else has these features. only an
+            # evaluator that needs no cells scores the same cells
+            # differently, and update gives every node its own
+            cells.score = self._score_all([cells])[0]
+        return cells.score
+
+
+# turns a BatchEvaluator into an evaluator factory. a class so
+# it can be pickled to another process, like the factory functions
+class BatchFactory(object):
+    __slots__ = ("_batch_type",)
+
+    def __init__(self, batch_type: Type[BatchEvaluator]) -> None:
+        self._batch_type = batch_type
+
+    def __call__(self, root: GameBoardNode) -> Callable[[GameBoardNode], float]:
+        return _BatchAdapter(self._batch_type(root), root)
+
+
+class _BatchRandomEvaluator(BatchEvaluator):
+    __slots__ = ("_generator",)
+
+    def __init__(self, root: GameBoardNode) -> None:
+        super().__init__(root)
+        self._generator = numpy.random.default_rng()
+
+    def score_batch(
+        self,
+        positions: Dict[str, "numpy.ndarray[Tuple[int, int], numpy.dtype[numpy.int64]]"],
+        count: int,
+    ) -> "numpy.ndarray[Tuple[int], numpy.dtype[numpy.float64]]":
+        return self._generator.integers(1, 101, count).astype(numpy.float64)
+
+
+# the same score as _DistanceEvaluator, from the same tables
+class _BatchDistanceEvaluator(BatchEvaluator):
+    __slots__ = ("_target_bits", "_first_unfilled", "_rows")
+
+    NEEDS = (OWN_PIECES,)
+
+    def __init__(self, root: GameBoardNode) -> None:
+        super().__init__(root)
+        if WIN_SLOTS[root.num_players] is None:
+            raise ValueError("invalid num players")
+        slot: int = WIN_SLOTS[root.num_players][root.agent_player_id-1]  # type: ignore
+        self._target_bits = numpy.array(_TARGET_BITS[slot], dtype=numpy.int64)
+        self._first_unfilled = numpy.array(_FIRST_UNFILLED, dtype=numpy.int64)
+        self._rows = numpy.array(_SLOT_DISTANCES[slot], dtype=numpy.int64)
+
+    def score_batch(
+        self,
+        positions: Dict[str, "numpy.ndarray[Tuple[int, int], numpy.dtype[numpy.int64]]"],
+        count: int,
+    ) -> "numpy.ndarray[Tuple[int], numpy.dtype[numpy.float64]]":
+        own = positions[OWN_PIECES]
+        # no two pieces share a cell, so the bits add up to the mask
+        filled = self._target_bits[own].sum(axis=1)
+        first = self._first_unfilled[filled]
+        totals = self._rows[first[:, numpy.newaxis], own].sum(axis=1)
+        return numpy.where(
+            first >= SLOT_SIZE,
+            1000000.0,
+            # impossible for the distance to be 0 unless every
+            # target is filled
+            1000/numpy.maximum(totals, 1),
+        )
+
+
+batch_evaluators: Dict[str, Type[BatchEvaluator]] = {
+    "random": _BatchRandomEvaluator,
+    "distance": _BatchDistanceEvaluator,
+}
+
+# offered alongside the other evaluators, see the end of
+# evaluators.py
+for _name, _batch_type in batch_evaluators.items():
+    evaluators["batch_" + _name] = BatchFactory(_batch_type)
@@ -0,0 +1,179 @@
+import collections
+
+from typing import Deque, Dict, Iterator, List, Tuple
+
+from chinesecheckers.geometry import (
+    CELLS,
+    CELL_BITS,
+    JUMPS,
+    NEIGHBOURS,
+    NUM_CELLS,
+    SLOT_SIZE,
+    Jump,
+)
+
+# a board is stored as one int per player, where bit i is set
+# if that player has a piece on CELLS[i], plus one int with
+# every occupied cell so emptiness checks are a single &
+
+_PossibleMoveList = Dict[Tuple[int, int], List[Tuple[int, int]]]
+
+
+def iter_cells(mask: int) -> Iterator[int]:
+    while mask:
+        low = mask & -mask
+        yield low.bit_length()-1
+        mask ^= low
+
+
+def masks_from_board(board: List[List[int]], num_players: int) -> Tuple[List[int], int]:
+    masks = [0] * (num_players+1)
+    occupied = 0
+    for i in range(NUM_CELLS):
+        x, y = CELLS[i]
+        p = board[x][y]
+        if p > 0:
+            masks[p] |= CELL_BITS[i]
+            occupied |= CELL_BITS[i]
+    return masks, occupied
+
+
+def _hop(occupied: int, jumps: Tuple[Jump, ...]) -> int:
+    # same rules as geometry.grid_hop, but every cell that
+    # has to be empty is checked with one &
+    for over, landing, _, path_mask in jumps:
+        if occupied & CELL_BITS[over]:
+            if occupied & path_mask:
+                return -1
+            return landing
+    return -1
+
+
+def moves_from_cell(occupied: int, source: int) -> _PossibleMoveList:
+    possible: _PossibleMoveList = {}
+    source_coords = CELLS[source]
+    # the moving piece is not on the board while it hops
+    occupied &= ~CELL_BITS[source]
+    visited = CELL_BITS[source]
+    q: Deque[int] = collections.deque()
+    q.append(source)
+
+    for cell in NEIGHBOURS[source]:
+        if not occupied & CELL_BITS[cell]:
+            possible[CELLS[cell]] = [source_coords, CELLS[cell]]
+
+    while len(q) > 0:
+        p = q.popleft()
+
+        for jumps in JUMPS[p]:
+            maybe_dest = _hop(occupied, jumps)
+            if maybe_dest != -1 and not visited & CELL_BITS[maybe_dest]:
+                visited |= CELL_BITS[maybe_dest]
+                q.append(maybe_dest)
+                if p == source:
+                    possible[CELLS[maybe_dest]] = [source_coords, CELLS[maybe_dest]]
+                else:
+                    new = list(possible[CELLS[p]])
+                    new.append(CELLS[maybe_dest])
+                    possible[CELLS[maybe_dest]] = new
+
+    return possible
+
+
+class MoveGenerator(object):
+    # finds every move a player has in one pass, writing them
+    # into buffers that are reused from call to call. only the
+    # source and destination of each move are kept, since the
+    # hops in between are only needed for the one move that
+    # gets sent to the server, which hop_chain works out
+    __slots__ = ("sources", "dests", "_queue", "_parents")
+
+    def __init__(self) -> None:
+        # after generate returns n, move i < n goes from
+        # sources[i] to dests[i]
+        self.sources = [0] * (SLOT_SIZE*NUM_CELLS)
+        self.dests = [0] * (SLOT_SIZE*NUM_CELLS)
+        self._queue = [0] * NUM_CELLS
+        self._parents = [0] * NUM_CELLS
+
+    def generate(self, occupied: int, pieces: int) -> int:
+        # moves come out in the same order moves_from_cell
+        # gives them for each piece
+        sources = self.sources
+        dests = self.dests
+        queue = self._queue
+        bits = CELL_BITS
+        n = 0
+        for source in iter_cells(pieces):
+            # the moving piece is not on the board while it hops
+            without_source = occupied & ~bits[source]
+
+            # a cell next to source may also be reachable by
+            # hopping, but it is still only one move
+            steps = 0
+            for cell in NEIGHBOURS[source]:
+                if not without_source & bits[cell]:
+                    steps |= bits[cell]
+                    sources[n] = source
+                    dests[n] = cell
+                    n += 1
+
+            visited = bits[source]
+            queue[0] = source
+            head = 0
+            tail = 1
+            while head < tail:
+                p = queue[head]
+                head += 1
+                for jumps in JUMPS[p]:
+                    # _hop, inlined since this is the hottest loop
+                    # in the search
+                    for over, landing, _, path_mask in jumps:
+                        if without_source & bits[over]:
+                            if (not without_source & path_mask
+                                    and not visited & bits[landing]):
+                                visited |= bits[landing]
+                                queue[tail] = landing
+                                tail += 1
+                                if not steps & bits[landing]:
+                                    sources[n] = source
+                                    dests[n] = landing
+                                    n += 1
+                            break
+        return n
+
+    def hop_chain(self, occupied: int, source: int, dest: int) -> List[Tuple[int, int]]:
+        # the cells a piece passes through moving from source to
+        # dest, found by searching from source again, this time
+        # remembering where each cell was reached from
+        without_source = occupied & ~CELL_BITS[source]
+        if without_source & CELL_BITS[dest]:
+            raise ValueError(f"{CELLS[dest]} is not empty")
+        if dest in NEIGHBOURS[source]:
+            return [CELLS[source], CELLS[dest]]
+
+        queue = self._queue
+        parents = self._parents
+        visited = CELL_BITS[source]
+        queue[0] = source
+        head = 0
+        tail = 1
+        while head < tail:
+            p = queue[head]
+            head += 1
+            for jumps in JUMPS[p]:
+                maybe_dest = _hop(without_source, jumps)
+                if maybe_dest != -1 and not visited & CELL_BITS[maybe_dest]:
+                    visited |= CELL_BITS[maybe_dest]
+                    parents[maybe_dest] = p
+                    queue[tail] = maybe_dest
+                    tail += 1
+                    if maybe_dest == dest:
+                        chain = [CELLS[dest]]
+                        while dest != source:
+                            dest = parents[dest]
+                            chain.append(CELLS[dest])
+                        chain.reverse()
+                        return chain
+
+        raise ValueError(f"no move from {CELLS[source]} to {CELLS[dest]}")
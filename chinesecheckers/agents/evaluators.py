@@ -1,9 +1,12 @@
+import importlib.util
 import math
 import random
-from typing import Callable, Dict
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
 
 from chinesecheckers.agents import SLOT_ENDPOINTS, WIN_SLOTS, generate_slot_coords
 from chinesecheckers.agents.GameBoardNode import GameBoardNode
+from chinesecheckers.agents.IncrementalEvaluator import Features, IncrementalEvaluator
+from chinesecheckers.geometry import CELL_INDEX, DISTANCES, NUM_CELLS, SLOT_SIZE
 
 
 def _generate_random_evaluator(root: GameBoardNode) -> Callable[[GameBoardNode], float]:
@@ -13,44 +16,188 @@ def _generate_random_evaluator(root: GameBoardNode) -> Callable[[GameBoardNode],
     return _random_evaluator
 
 
+def _first_unfilled(filled: int) -> int:
+    # index of the lowest 0 bit
+    return (~filled & (filled+1)).bit_length() - 1
+
+
+def _slot_targets(slot: int) -> Tuple[int, ...]:
+    # the cells of a slot, nearest its far corner first, which is
+    # the order they are best filled in
+    endpoint = SLOT_ENDPOINTS[slot]
+    return tuple(
+        CELL_INDEX[x][y]
+        for x, y in sorted(
+            generate_slot_coords(slot),
+            key=lambda point: math.hypot(point[0]-endpoint[0], point[1]-endpoint[1]),
+        )
+    )
+
+
+# _SLOT_TARGETS[slot][i] is the i'th cell of slot to fill
+_SLOT_TARGETS = tuple(_slot_targets(slot) for slot in range(6))
+# _TARGET_BITS[slot][cell] is the bit cell sets in a mask of the
+# targets of slot that are filled, or 0 if it is not one of them
+_TARGET_BITS: Tuple[Tuple[int, ...], ...] = tuple(
+    tuple(
+        1 << targets.index(cell) if cell in targets else 0
+        for cell in range(NUM_CELLS)
+    )
+    for targets in _SLOT_TARGETS
+)
+# _FIRST_UNFILLED[filled] is the index of the first target not
+# in the filled mask, or SLOT_SIZE if they all are
+_FIRST_UNFILLED = tuple(_first_unfilled(filled) for filled in range(1 << SLOT_SIZE))
+# _SLOT_DISTANCES[slot][i][cell] is the distance from cell to the
+# i'th target of slot. the extra row of 0s is for when every
+# target is filled
+_SLOT_DISTANCES: Tuple[Tuple[Tuple[int, ...], ...], ...] = tuple(
+    tuple(DISTANCES[target] for target in targets) + ((0,)*NUM_CELLS,)
+    for targets in _SLOT_TARGETS
+)
+
+
+# an evaluator whose features are (bitmask of the target cells
+# our pieces are already on, index of the first target cell that
+# is still free, total of the rows table for that target over
+# our pieces). rows[i][cell] is what a piece on cell adds when
+# target i is the first free one, and rows[SLOT_SIZE] is for
+# when every target is filled. a new evaluator of this kind only
+# needs its table and a score
+class _TargetTableEvaluator(IncrementalEvaluator):
+    __slots__ = (
+        "_agent_player_id",
+        "_target_bits",
+        "_rows",
+    )
+
+    def __init__(
+        self,
+        agent_player_id: int,
+        slot: int,
+        rows: Sequence[Sequence[int]],
+    ) -> None:
+        self._agent_player_id = agent_player_id
+        self._target_bits = _TARGET_BITS[slot]
+        self._rows = rows
+
+    def _pieces(self, node: GameBoardNode) -> List[int]:
+        return [CELL_INDEX[x][y] for x, y in node.get_pieces(self._agent_player_id)]
+
+    def features(self, node: GameBoardNode) -> Features:
+        pieces = self._pieces(node)
+        filled = 0
+        for cell in pieces:
+            filled |= self._target_bits[cell]
+
+        i = _FIRST_UNFILLED[filled]
+        row = self._rows[i]
+        return (filled, i, sum(row[cell] for cell in pieces))
+
+    def update(
+        self,
+        features: Features,
+        player_id: int,
+        source: Tuple[int, int],
+        dest: Tuple[int, int],
+        node: GameBoardNode,
+    ) -> Features:
+        if player_id != self._agent_player_id:
+            return features
+
+        filled, i, total = features
+        source_cell = CELL_INDEX[source[0]][source[1]]
+        dest_cell = CELL_INDEX[dest[0]][dest[1]]
+        filled = (filled & ~self._target_bits[source_cell]) | self._target_bits[dest_cell]
+
+        new_i = _FIRST_UNFILLED[filled]
+        row = self._rows[new_i]
+        if new_i != i:
+            # the cell everything is measured to moved, which only
+            # happens when a target cell fills or empties
+            return (filled, new_i, sum(row[cell] for cell in self._pieces(node)))
+        return (filled, i, total + row[dest_cell] - row[source_cell])
+
+    def update_many(
+        self,
+        features: Features,
+        player_id: int,
+        source_cells: Sequence[int],
+        dest_cells: Sequence[int],
+        node: GameBoardNode,
+    ) -> Optional[List[Features]]:
+        if player_id != self._agent_player_id:
+            return [features] * len(source_cells)
+
+        filled, i, total = features
+        pieces = self._pieces(node)
+        # the parent's total for each target, only filled in for
+        # the targets some child actually ends up measuring to
+        parent_totals = {i: total}
+        children: List[Features] = []
+        for source_cell, dest_cell in zip(source_cells, dest_cells):
+            new_filled = (
+                (filled & ~self._target_bits[source_cell])
+                | self._target_bits[dest_cell]
+            )
+            new_i = _FIRST_UNFILLED[new_filled]
+            row = self._rows[new_i]
+            if new_i not in parent_totals:
+                parent_totals[new_i] = sum(row[cell] for cell in pieces)
+            children.append((
+                new_filled,
+                new_i,
+                parent_totals[new_i] - row[source_cell] + row[dest_cell],
+            ))
+        return children
+
+
+# total distance from our pieces to the first free target cell
+class _DistanceEvaluator(_TargetTableEvaluator):
+    __slots__ = ()
+
+    def __init__(self, agent_player_id: int, slot: int) -> None:
+        super().__init__(agent_player_id, slot, _SLOT_DISTANCES[slot])
+
+    def score(self, features: Features) -> float:
+        if features[1] >= SLOT_SIZE:
+            return 1000000
+        # impossible for the distance to be 0
+        return 1000/features[2]
+
+
 def _generate_distance_evaluator(root: GameBoardNode) -> Callable[[GameBoardNode], float]:
-    # use a closure to precompute fixed values for the agent
     if WIN_SLOTS[root.num_players] is None:
         raise ValueError("invalid num players")
 
     # >:( typescript would know that it can't be None (i think...?)
     target_slot: int = WIN_SLOTS[root.num_players][root.agent_player_id-1]  # type: ignore
-    endpoint = SLOT_ENDPOINTS[target_slot]
-    coords_to_check = sorted(
-        tuple(generate_slot_coords(target_slot)),
-        key=lambda point: math.hypot(point[0]-endpoint[0], point[1]-endpoint[1]),
-    )
+    return _DistanceEvaluator(root.agent_player_id, target_slot)
 
-    def _distance_evaluator(node: GameBoardNode) -> float:
-        i: int = 0
-        slot = coords_to_check[0]
-        while node.state[slot[0]][slot[1]] == node.agent_player_id:
-            i += 1
-            if i >= 10:
-                return 1000000
-            slot = coords_to_check[i]
 
-        dist: float = 0
-        for piece in node.pieces[node.agent_player_id]:
-            # https://www.redblobgames.com/grids/hexagons/#distances
-            dist += (
-                abs(piece[0]-slot[0])
-                + abs(piece[1]-slot[1])
-                + abs(-piece[0]-piece[1]+slot[0]+slot[1])
-            ) / 2
-
-        # impossible for dist to be 0
-        return 1000/dist
-
-    return _distance_evaluator
+def player_evaluators(
+    evaluator: Callable[[GameBoardNode], Callable[[GameBoardNode], float]],
+    root: GameBoardNode,
+) -> List[Callable[[GameBoardNode], float]]:
+    # one evaluator per player by player id, each made by the same
+    # factory but for that player. index 0 is root's own evaluator
+    evaluators = [root.evaluator]
+    agent_player_id = root.agent_player_id
+    for player_id in range(1, root.num_players+1):
+        # factories take the player to score for from the root
+        # they are made for
+        root.agent_player_id = player_id
+        evaluators.append(evaluator(root))
+    root.agent_player_id = agent_player_id
+    return evaluators
 
 
 evaluators: Dict[str, Callable[[GameBoardNode], Callable[[GameBoardNode], float]]] = {
     "random": _generate_random_evaluator,
     "distance": _generate_distance_evaluator,
 }
+
+# the batch evaluators (see batch_evaluators.py) are only
+# offered with numpy. they add themselves here when imported
+if importlib.util.find_spec("numpy") is not None:
+    import chinesecheckers.agents.batch_evaluators  # noqa: F401
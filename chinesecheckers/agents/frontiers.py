@@ -0,0 +1,257 @@
+import abc
+import collections
+import heapq
+import itertools
+
+from typing import Callable, ClassVar, Deque, Dict, Iterator, List, Optional, Tuple, Union
+
+from chinesecheckers.agents.GameBoardNode import GameBoardNode
+from chinesecheckers.agents.MoveNode import MoveNode
+
+_Node = Union[GameBoardNode, MoveNode]
+
+
+# the nodes MaxAgent has yet to expand, and the order it expands
+# them in. nodes that pop out may have been cut off the tree since
+# they went in, which the agent checks for itself
+class Frontier(abc.ABC):
+    __slots__ = ()
+
+    # whether push_children wants the children best first for the
+    # player making their moves, see GameBoardNode.best_first
+    ORDERED: ClassVar[bool] = False
+
+    @abc.abstractmethod
+    def push(self, node: _Node) -> None:
+        pass
+
+    def push_children(self, children: List[_Node]) -> None:
+        # the children of one node, just expanded. always the node
+        # popped last, or the root after a restart
+        for child in children:
+            self.push(child)
+
+    @abc.abstractmethod
+    def pop(self) -> Optional[_Node]:
+        # None if there is nothing left worth expanding
+        pass
+
+    @abc.abstractmethod
+    def __len__(self) -> int:
+        pass
+
+    @abc.abstractmethod
+    def retain(self, keep: Callable[[_Node], bool]) -> None:
+        # forget every node keep is false for
+        pass
+
+    def restart(self) -> None:
+        # the root moved, or the search is starting over from it
+        pass
+
+
+# breadth first, which is how MaxAgent has always searched
+class FifoFrontier(Frontier):
+    __slots__ = ("_queue",)
+
+    def __init__(self) -> None:
+        self._queue: Deque[_Node] = collections.deque()
+
+    def push(self, node: _Node) -> None:
+        self._queue.append(node)
+
+    def push_children(self, children: List[_Node]) -> None:
+        self._queue.extend(children)
+
+    def pop(self) -> Optional[_Node]:
+        if len(self._queue) == 0:
+            return None
+        return self._queue.popleft()
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def retain(self, keep: Callable[[_Node], bool]) -> None:
+        live = [node for node in self._queue if keep(node)]
+        self._queue.clear()
+        self._queue.extend(live)
+
+
+# (-score, depth, order pushed, node). ties on score go to the
+# shallower node, then the older one, so nodes never get compared
+_Entry = Tuple[float, int, int, _Node]
+
+
+def _entry(node: _Node, order: Iterator[int]) -> _Entry:
+    return (-node.score, node.depth, next(order), node)
+
+
+# (-score, depth+discrepancy, depth, order pushed, node). a
+# node's discrepancy is how far the moves on its path stray from
+# the best ones: the sum of each move's place among its siblings,
+# best first for the player making it. the scores are the agent's,
+# so an opponent's moves all score the same as the position they
+# are made from. ties like that go first to the nodes nearest the
+# root and the line every player is expected to play, so that
+# line is searched deeper than the rest, but not forever
+_RankedEntry = Tuple[float, int, int, int, _Node]
+
+
+# the best scoring node first, wherever it is in the tree. a node
+# pushed on its own, like the root, is searched as though it were
+# one of the best moves
+class BestFirstFrontier(Frontier):
+    __slots__ = ("_heap", "_order", "_popped")
+
+    ORDERED = True
+
+    def __init__(self) -> None:
+        self._heap: List[_RankedEntry] = []
+        self._order = itertools.count()
+        # the discrepancy of the node popped last
+        self._popped = 0
+
+    def _push_ranked(self, node: _Node, discrepancy: int) -> None:
+        heapq.heappush(
+            self._heap,
+            (-node.score, node.depth+discrepancy, node.depth, next(self._order), node),
+        )
+
+    def push(self, node: _Node) -> None:
+        self._push_ranked(node, 0)
+
+    def push_children(self, children: List[_Node]) -> None:
+        for rank, child in enumerate(children):
+            self._push_ranked(child, self._popped+rank)
+
+    def pop(self) -> Optional[_Node]:
+        if len(self._heap) == 0:
+            return None
+        _, cost, depth, _, node = heapq.heappop(self._heap)
+        self._popped = cost-depth
+        return node
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def retain(self, keep: Callable[[_Node], bool]) -> None:
+        self._heap = [entry for entry in self._heap if keep(entry[4])]
+        heapq.heapify(self._heap)
+
+    def restart(self) -> None:
+        self._popped = 0
+
+
+# one depth at a time like breadth first, but only the width best
+# nodes at each depth are expanded and the rest are dropped
+class BeamFrontier(Frontier):
+    __slots__ = ("_width", "_heaps", "_expanded", "_order", "_size")
+
+    def __init__(self, width: int = 32) -> None:
+        self._width = width
+        # the nodes waiting at each depth, and how many nodes at
+        # each depth have been expanded since the root moved
+        self._heaps: Dict[int, List[_Entry]] = {}
+        self._expanded: Dict[int, int] = {}
+        self._order = itertools.count()
+        self._size = 0
+
+    def push(self, node: _Node) -> None:
+        heapq.heappush(self._heaps.setdefault(node.depth, []), _entry(node, self._order))
+        self._size += 1
+
+    def pop(self) -> Optional[_Node]:
+        # everything at a depth was pushed before anything deeper
+        # is popped, so the shallowest heap is always complete
+        while len(self._heaps) > 0:
+            depth = min(self._heaps)
+            heap = self._heaps[depth]
+            expanded = self._expanded.get(depth, 0)
+            if len(heap) == 0 or expanded >= self._width:
+                self._size -= len(heap)
+                del self._heaps[depth]
+                continue
+            self._expanded[depth] = expanded+1
+            self._size -= 1
+            return heapq.heappop(heap)[3]
+        return None
+
+    def __len__(self) -> int:
+        return self._size
+
+    def retain(self, keep: Callable[[_Node], bool]) -> None:
+        self._size = 0
+        for depth, heap in self._heaps.items():
+            live = [entry for entry in heap if keep(entry[3])]
+            heapq.heapify(live)
+            self._heaps[depth] = live
+            self._size += len(live)
+
+    def restart(self) -> None:
+        self._expanded.clear()
+
+
+# like BestFirstFrontier, but only the initial best children of
+# a node go in when it is expanded. every time one of them is
+# expanded its next best sibling joins, so a node's moves are
+# considered more widely the more its subtree turns out to be
+# worth searching
+class WideningFrontier(Frontier):
+    __slots__ = ("_initial", "_heap", "_order", "_popped")
+
+    ORDERED = True
+
+    def __init__(self, initial: int = 4) -> None:
+        self._initial = initial
+        # each entry also has the discrepancy of its parent, how many
+        # children the parent has, and the siblings still to go in,
+        # best last, which it shares with them. see _RankedEntry
+        self._heap: List[Tuple[float, int, int, int, _Node, int, int, List[_Node]]] = []
+        self._order = itertools.count()
+        self._popped = 0
+
+    def _push_next(self, base: int, count: int, siblings: List[_Node]) -> None:
+        # the siblings go in in order, so the next one's place is
+        # however many went in before it
+        rank = count - len(siblings)
+        node = siblings.pop()
+        heapq.heappush(
+            self._heap,
+            (-node.score, node.depth+base+rank, node.depth, next(self._order), node, base, count, siblings),
+        )
+
+    def push(self, node: _Node) -> None:
+        self._push_next(0, 1, [node])
+
+    def push_children(self, children: List[_Node]) -> None:
+        # reversed, so the next best is always popped off the end
+        rest = children[::-1]
+        for _ in range(min(self._initial, len(rest))):
+            self._push_next(self._popped, len(children), rest)
+
+    def pop(self) -> Optional[_Node]:
+        if len(self._heap) == 0:
+            return None
+        _, cost, depth, _, node, base, count, siblings = heapq.heappop(self._heap)
+        self._popped = cost-depth
+        if len(siblings) > 0:
+            self._push_next(base, count, siblings)
+        return node
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def retain(self, keep: Callable[[_Node], bool]) -> None:
+        self._heap = [entry for entry in self._heap if keep(entry[4])]
+        heapq.heapify(self._heap)
+
+    def restart(self) -> None:
+        self._popped = 0
+
+
+frontiers: Dict[str, Callable[[], Frontier]] = {
+    "fifo": FifoFrontier,
+    "best": BestFirstFrontier,
+    "beam": BeamFrontier,
+    "widening": WideningFrontier,
+}
@@ -0,0 +1,21 @@
+from chinesecheckers.agents.MctsNode import MCTS_NODE_TYPES
+from chinesecheckers.agents.MctsSearch import MctsSearch
+from chinesecheckers.agents.evaluators import evaluators, player_evaluators
+from chinesecheckers.server.GameBoard import GameBoard
+
+
+def test_iterate_from_children_without_priors() -> None:
+    # Agent.expand_once makes the root's children with expand(),
+    # which leaves them unvisited, and the search has to cope
+    grid = GameBoard(6, True).grid
+    for name in ("distance", "random"):
+        for node_type in MCTS_NODE_TYPES.values():
+            root = node_type.root_init(grid, evaluators[name], 1, 1)
+            root.expand()
+            search = MctsSearch(player_evaluators(evaluators[name], root))
+            search.set_root(root)
+            children = root.mcts_children()
+            for _ in range(len(children)+1):
+                search.iterate()
+            assert root.visits == len(children)+1
+            assert all(child.visits > 0 for child in children)
@@ -0,0 +1,94 @@
+# plays random games and checks after every move that each
+# incremental evaluator's features, from update and from
+# update_many, match recomputing them with features()
+import random
+
+from typing import Callable, List, Type, Union, cast
+
+from chinesecheckers.agents import BitBoardNode, GameBoardNode
+from chinesecheckers.agents.IncrementalEvaluator import Features, IncrementalEvaluator
+from chinesecheckers.agents.SearchBoard import SearchBoard
+from chinesecheckers.agents.evaluators import evaluators
+from chinesecheckers.server.GameBoard import GameBoard
+
+# the random evaluators score the same position differently every
+# time, so there's nothing to compare them against. they are only
+# checked for doing that
+EVALUATORS = [name for name in evaluators if not name.endswith("random")]
+RANDOM_EVALUATORS = [name for name in evaluators if name.endswith("random")]
+NUM_PLAYERS = (2, 3, 4, 6)
+NODE_TYPES: List[Union[Type[GameBoardNode], Type[BitBoardNode]]] = [
+    GameBoardNode,
+    BitBoardNode,
+]
+# random games hardly ever end, so each one is cut off here
+MAX_PLIES = 60
+SEED = 0
+
+
+def check(name: str, node: GameBoardNode, what: str) -> None:
+    evaluator = cast(IncrementalEvaluator, node.evaluator)
+    features = cast(Features, node.features)
+    expected = evaluator.features(node)
+    # a batch evaluator's features hold each player's cells in
+    # no particular order, so only its scores have to agree
+    if not name.startswith("batch_"):
+        assert features == expected, f"{name} {what} drifted after {node.move}"
+    assert evaluator.score(features) == evaluator.score(expected), (
+        f"{name} {what} drifted after {node.move}: {features} != {expected}"
+    )
+
+
+def check_game(
+    name: str,
+    node_type: Union[Type[GameBoardNode], Type[BitBoardNode]],
+    num_players: int,
+    agent_player_id: int,
+) -> None:
+    grid = GameBoard(num_players, True).grid
+    first = random.randint(1, num_players)
+    factory: Callable[[GameBoardNode], Callable[[GameBoardNode], float]] = evaluators[name]
+    node: GameBoardNode = node_type.root_init(grid, factory, agent_player_id, first)
+    assert node.features is not None, f"{name} is not incremental"
+    board = SearchBoard.root_init(grid, factory, agent_player_id, first)
+
+    for _ in range(MAX_PLIES):
+        if node.remaining_players == 0:
+            break
+        # every child's features come from one update_many
+        children = cast(List[GameBoardNode], node.expand())
+        for child in children:
+            check(name, child, "update_many")
+        move = random.choice(children).move
+
+        # and the same move through update, once on a node and
+        # once made in place on a SearchBoard
+        check(name, node_type(node, move), "update")
+        board.make_move(move)
+        check(name, board, "make_move")
+
+        node = node.reroot(move)
+
+
+def test_incremental_features_match_full_evaluation() -> None:
+    random.seed(SEED)
+    for name in EVALUATORS:
+        for node_type in NODE_TYPES:
+            for num_players in NUM_PLAYERS:
+                for agent_player_id in range(1, num_players+1):
+                    check_game(name, node_type, num_players, agent_player_id)
+
+
+def test_random_evaluators_vary() -> None:
+    # a random evaluator that handed every node the same score
+    # would leave the search nothing to pick between
+    random.seed(SEED)
+    grid = GameBoard(2, True).grid
+    for name in RANDOM_EVALUATORS:
+        for node_type in NODE_TYPES:
+            root = node_type.root_init(grid, evaluators[name], 1, 1)
+            children = cast(List[GameBoardNode], root.expand())
+            grandchildren = cast(List[GameBoardNode], children[0].expand())
+            for nodes in (children, grandchildren):
+                scores = {node.score for node in nodes}
+                assert len(scores) > 1, f"{name} gave every {node_type.__name__} {scores}"
@@ -0,0 +1,21 @@
+import random
+
+from typing import Tuple
+
+from chinesecheckers.geometry import NUM_CELLS
+
+# https://www.chessprogramming.org/Zobrist_Hashing
+# a position's hash is the xor of one key per piece (by owner and
+# cell) and one key for whose turn it is, so a move only has to
+# xor out the old cell and xor in the new one
+
+_rng = random.Random(41047)
+
+# PIECE_KEYS[player_id][cell]
+PIECE_KEYS: Tuple[Tuple[int, ...], ...] = tuple(
+    tuple(_rng.getrandbits(64) for _ in range(NUM_CELLS))
+    for _ in range(7)
+)
+
+# TURN_KEYS[player_id]
+TURN_KEYS: Tuple[int, ...] = tuple(_rng.getrandbits(64) for _ in range(7))
@@ -0,0 +1,241 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from chinesecheckers import BOARD_SIZE
+
+
+def _on_star(x: int, y: int) -> bool:
+    # the star is the union of two big triangles, one
+    # pointing each way
+    return (
+        (x >= 4 and y >= 4 and x+y <= 20)
+        or (x <= 12 and y <= 12 and x+y >= 12)
+    )
+
+
+# every real cell of the board, in row major order. a cell
+# index is a position in this tuple
+CELLS: Tuple[Tuple[int, int], ...] = tuple(
+    (x, y)
+    for x in range(BOARD_SIZE)
+    for y in range(BOARD_SIZE)
+    if _on_star(x, y)
+)
+NUM_CELLS = len(CELLS)
+
+# CELL_INDEX[x][y] is the index of (x, y) in CELLS, or -1
+# if (x, y) is one of the -1 squares outside the star
+CELL_INDEX: List[List[int]] = [[-1]*BOARD_SIZE for _ in range(BOARD_SIZE)]
+for _i, (_x, _y) in enumerate(CELLS):
+    CELL_INDEX[_x][_y] = _i
+
+CELL_BITS: Tuple[int, ...] = tuple(1 << i for i in range(NUM_CELLS))
+ALL_CELLS_MASK = (1 << NUM_CELLS) - 1
+
+
+def cell_index(x: int, y: int) -> int:
+    if x < 0 or x >= BOARD_SIZE or y < 0 or y >= BOARD_SIZE:
+        return -1
+    return CELL_INDEX[x][y]
+
+
+def hex_distance(a: Tuple[int, int], b: Tuple[int, int]) -> int:
+    # https://www.redblobgames.com/grids/hexagons/#distances
+    return (
+        abs(a[0]-b[0])
+        + abs(a[1]-b[1])
+        + abs(-a[0]-a[1]+b[0]+b[1])
+    ) // 2
+
+
+# DISTANCES[a][b] is the hex distance between cells a and b, so
+# nothing has to work it out while searching
+DISTANCES: Tuple[Tuple[int, ...], ...] = tuple(
+    tuple(hex_distance(a, b) for b in CELLS)
+    for a in CELLS
+)
+
+# the six directions a piece can move in, in the same
+# order the move generators have always tried them
+DELTAS = (
+    (1, 0),
+    (-1, 0),
+    (0, 1),
+    (0, -1),
+    (-1, 1),
+    (1, -1)
+)
+
+
+def _ray(cell: int, dx: int, dy: int) -> Tuple[int, ...]:
+    x, y = CELLS[cell]
+    ray: List[int] = []
+    x += dx
+    y += dy
+    while cell_index(x, y) != -1:
+        ray.append(CELL_INDEX[x][y])
+        x += dx
+        y += dy
+    return tuple(ray)
+
+
+# RAYS[cell][d] is every cell passed when walking from cell in
+# direction DELTAS[d] until falling off the star
+RAYS: Tuple[Tuple[Tuple[int, ...], ...], ...] = tuple(
+    tuple(_ray(cell, dx, dy) for dx, dy in DELTAS)
+    for cell in range(NUM_CELLS)
+)
+
+NEIGHBOURS: Tuple[Tuple[int, ...], ...] = tuple(
+    tuple(ray[0] for ray in RAYS[cell] if len(ray) > 0)
+    for cell in range(NUM_CELLS)
+)
+
+# a jump is (jumped cell, landing cell, cells that have to be
+# empty, the same cells as a bitmask). the empty cells are
+# the ones before and after the jumped piece, landing included
+Jump = Tuple[int, int, Tuple[int, ...], int]
+
+
+def _jumps(ray: Tuple[int, ...]) -> Tuple[Jump, ...]:
+    jumps: List[Jump] = []
+    gap = 0
+    while 2*gap+1 < len(ray):
+        path = ray[:gap] + ray[gap+1:2*gap+2]
+        jumps.append((
+            ray[gap],
+            ray[2*gap+1],
+            path,
+            sum(CELL_BITS[cell] for cell in path),
+        ))
+        gap += 1
+    return tuple(jumps)
+
+
+# JUMPS[cell][d][gap] is the jump over the piece gap cells
+# away in direction DELTAS[d]. the first piece along a ray
+# is the only one that can be jumped, so a hop in a direction
+# is found by taking the first jump whose jumped cell is full
+JUMPS: Tuple[Tuple[Tuple[Jump, ...], ...], ...] = tuple(
+    tuple(_jumps(ray) for ray in RAYS[cell])
+    for cell in range(NUM_CELLS)
+)
+
+# HOPS[source][dest] is (jumped cell, cells that have to be
+# empty) for the step or jump from source that lands on dest.
+# a step jumps no cell, -1, and only needs dest empty. dests
+# that can't be reached in one step or jump are missing, so a
+# move is checked with a lookup rather than by walking the line
+Hop = Tuple[int, Tuple[int, ...]]
+HOPS: Tuple[Dict[int, Hop], ...] = tuple(
+    dict(
+        [(dest, (-1, (dest,))) for dest in NEIGHBOURS[cell]]
+        + [
+            (landing, (over, path))
+            for jumps in JUMPS[cell]
+            for over, landing, path, _ in jumps
+        ]
+    )
+    for cell in range(NUM_CELLS)
+)
+
+
+def grid_hop(board: List[List[int]], jumps: Tuple[Jump, ...]) -> int:
+    # the landing cell of the hop along one ray of JUMPS on a
+    # 17x17 board, or -1 if there is none
+    for over, landing, path, _ in jumps:
+        x, y = CELLS[over]
+        if board[x][y] != 0:
+            for cell in path:
+                x, y = CELLS[cell]
+                if board[x][y] != 0:
+                    return -1
+            return landing
+    return -1
+
+
+def grid_is_hop(
+    board: List[List[int]],
+    source: int,
+    dest: int,
+    allow_single: bool,
+) -> bool:
+    # whether one step (if allowed) or one jump gets a piece from
+    # source to dest on a 17x17 board
+    hop = HOPS[source].get(dest)
+    if hop is None:
+        return False
+    over, path = hop
+    if over == -1:
+        if not allow_single:
+            return False
+    else:
+        x, y = CELLS[over]
+        if board[x][y] == 0:
+            return False
+    for cell in path:
+        x, y = CELLS[cell]
+        if board[x][y] != 0:
+            return False
+    return True
+
+
+# slot: one of the triangles surrounding the board where
+# pieces start and end in. slot 0 is the top most, then
+# ascending clockwise
+SLOT_BOUNDS = (
+    (9, 12, 3, False),
+    (13, 16, 4, True),
+    (9, 12, 12, False),
+    (4, 7, 13, True),
+    (0, 3, 12, False),
+    (4, 7, 4, True),
+)
+
+
+def generate_slot_coords(slot_number: int) -> Iterable[Tuple[int, int]]:
+    start_x, end_x, y_edge, pointing_up = SLOT_BOUNDS[slot_number]
+    if pointing_up:
+        scan = 4
+        for x in range(start_x, end_x+1):
+            for y in range(y_edge, y_edge+scan):
+                yield (x, y)
+            scan -= 1
+    else:
+        scan = 0
+        for x in range(start_x, end_x+1):
+            for y in range(y_edge-scan, y_edge+1):
+                yield (x, y)
+            scan += 1
+
+
+SLOT_SIZE = 10
+
+SLOT_CELLS: Tuple[Tuple[int, ...], ...] = tuple(
+    tuple(CELL_INDEX[x][y] for x, y in generate_slot_coords(slot))
+    for slot in range(6)
+)
+
+# CELL_SLOT[cell] is the slot cell is in, or -1 for the
+# cells in the middle of the board
+CELL_SLOT: List[int] = [-1]*NUM_CELLS
+for _slot, _cells in enumerate(SLOT_CELLS):
+    for _i in _cells:
+        CELL_SLOT[_i] = _slot
+
+# WIN_SLOTS[i][j] is the slot that player j+1
+# needs to fill to win, in a game of i players
+WIN_SLOTS: Tuple[Optional[Tuple[int, ...]], ...] = (
+    None,
+    None,
+    (3, 0),
+    (4, 0, 2),
+    (4, 5, 1, 2),
+    None,
+    (3, 4, 5, 0, 1, 2),
+)
+
+
+def count_slot_fill(slot_number: int, cells: Iterable[int]) -> int:
+    # how many of cells are in the slot. a player has won
+    # once this reaches SLOT_SIZE for their own pieces
+    return sum(1 for cell in cells if CELL_SLOT[cell] == slot_number)
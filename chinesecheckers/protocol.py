@@ -0,0 +1,215 @@
+import asyncio
+import json
+import socket
+
+from typing import Dict, List, Optional, Tuple, Union
+
+from chinesecheckers import BOARD_SIZE
+from chinesecheckers.geometry import CELLS, CELL_INDEX, NUM_CELLS
+
+# every message is one json object on its own line, so a read
+# can end in the middle of a message or hold several of them
+RECV_SIZE = 4096
+
+# (msg, payload), where the payload is whatever json it was sent as
+Message = Tuple[str, object]
+# what anything that can't be decoded comes out as
+_ERROR: Message = ("error", None)
+
+# the payload of hello. a client that wants the binary encoding
+# sends [HELLO, BINARY] instead, and everything after its hello,
+# both ways, is binary
+HELLO = 12345
+BINARY = "binary"
+
+# in the binary encoding a message is one byte saying which it
+# is, followed by its payload:
+#   _BYTE: one byte (a player id, or ready's true)
+#   _BOARD: the 121 cells of the board, in CELLS order
+#   _HOPS: how many cells the move visits, then each cell's index.
+#     a move never visits a cell twice, so that fits in a byte
+_NONE = 0
+_BYTE = 1
+_BOARD = 2
+_HOPS = 3
+
+# (msg, payload kind), indexed by the message's byte
+_BINARY_MESSAGES: Tuple[Tuple[str, int], ...] = (
+    ("no", _NONE),
+    ("what", _NONE),
+    ("assign_id", _BYTE),
+    ("ready", _BYTE),
+    ("board_init", _BOARD),
+    ("starting_player", _BYTE),
+    ("request_move", _NONE),
+    ("make_move", _HOPS),
+    ("move", _HOPS),
+    ("game_over", _NONE),
+)
+_BINARY_CODES: Dict[str, int] = {
+    msg: i for i, (msg, _) in enumerate(_BINARY_MESSAGES)
+}
+
+
+def hello_payload(binary: bool) -> Union[int, List[object]]:
+    if binary:
+        return [HELLO, BINARY]
+    return HELLO
+
+
+def encode(msg: str, payload: object = None) -> bytes:
+    data: Dict[str, object] = {"msg": msg}
+    if payload is not None:
+        data["payload"] = payload
+    # tuples come out as lists
+    return bytes(json.dumps(data) + "\n", "ascii")
+
+
+def encode_binary(msg: str, payload: object = None) -> bytes:
+    code = _BINARY_CODES[msg]
+    kind = _BINARY_MESSAGES[code][1]
+    if kind == _NONE:
+        return bytes((code,))
+    if kind == _BYTE:
+        return bytes((code, int(payload)))  # type: ignore
+    if kind == _BOARD:
+        grid: List[List[int]] = payload  # type: ignore
+        return bytes((code,)) + bytes(grid[x][y] for x, y in CELLS)
+    hops: List[List[int]] = payload  # type: ignore
+    return bytes((code, len(hops))) + bytes(CELL_INDEX[x][y] for x, y in hops)
+
+
+def decode(line: bytes) -> Message:
+    try:
+        data = json.loads(line)
+    except ValueError:
+        return _ERROR
+    if not isinstance(data, dict):
+        return _ERROR
+    return (
+        data.get("msg", "error"),
+        data.get("payload", None),
+    )
+
+
+def decode_binary(data: bytes, start: int) -> Optional[Tuple[Message, int]]:
+    # decodes the message at data[start:], giving it and where it
+    # ends, or None if it hasn't all been received yet. payloads
+    # come out the same as they would from json, and anything that
+    # isn't a message comes out as an error, like bad json
+    if start >= len(data):
+        return None
+    if data[start] >= len(_BINARY_MESSAGES):
+        # there's no telling how long an unknown message is, so
+        # only its first byte is skipped
+        return _ERROR, start+1
+    msg, kind = _BINARY_MESSAGES[data[start]]
+    if kind == _NONE:
+        return (msg, None), start+1
+    if kind == _BYTE:
+        if start+2 > len(data):
+            return None
+        value = data[start+1]
+        if msg == "ready":
+            return (msg, value != 0), start+2
+        return (msg, value), start+2
+    if kind == _BOARD:
+        end = start+1+NUM_CELLS
+        if end > len(data):
+            return None
+        grid = [[-1]*BOARD_SIZE for _ in range(BOARD_SIZE)]
+        for cell in range(NUM_CELLS):
+            x, y = CELLS[cell]
+            grid[x][y] = data[start+1+cell]
+        return (msg, grid), end
+    if start+2 > len(data):
+        return None
+    end = start+2+data[start+1]
+    if end > len(data):
+        return None
+    cells = data[start+2:end]
+    if any(cell >= NUM_CELLS for cell in cells):
+        return _ERROR, end
+    return (msg, [list(CELLS[cell]) for cell in cells]), end
+
+
+# splits received bytes into messages. everything received past
+# the end of one message is kept for the next, however many there
+# are, so it doesn't matter how the bytes were split up in transit
+class MessageBuffer(object):
+    __slots__ = ("_buffer", "_binary")
+
+    def __init__(self) -> None:
+        # received bytes that haven't been taken as a message yet
+        self._buffer = b""
+        self._binary = False
+
+    def set_binary(self) -> None:
+        # messages are only taken out of the buffer when asked for,
+        # so anything after the hello is still there to be read as
+        # binary
+        self._binary = True
+
+    def feed(self, data: bytes) -> None:
+        self._buffer += data
+
+    def take(self) -> Optional[Message]:
+        # the next whole message, or None if there isn't one yet
+        if self._binary:
+            decoded = decode_binary(self._buffer, 0)
+            if decoded is None:
+                return None
+            message, end = decoded
+            self._buffer = self._buffer[end:]
+            return message
+
+        while True:
+            end = self._buffer.find(b"\n")
+            if end == -1:
+                return None
+            line = self._buffer[:end]
+            self._buffer = self._buffer[end+1:]
+            if len(line.strip()) > 0:
+                return decode(line)
+
+    @property
+    def binary(self) -> bool:
+        return self._binary
+
+
+# reads messages off a blocking socket
+class MessageReader(MessageBuffer):
+    __slots__ = ("_sock",)
+
+    def __init__(self, sock: socket.socket) -> None:
+        super().__init__()
+        self._sock = sock
+
+    def receive(self) -> Message:
+        while True:
+            message = self.take()
+            if message is not None:
+                return message
+            data = self._sock.recv(RECV_SIZE)
+            if len(data) == 0:
+                raise ConnectionError("connection closed")
+            self.feed(data)
+
+
+# reads messages off an asyncio stream, for the server
+class AsyncMessageReader(MessageBuffer):
+    __slots__ = ("_stream",)
+
+    def __init__(self, stream: asyncio.StreamReader) -> None:
+        super().__init__()
+        self._stream = stream
+
+    async def receive(self) -> Message:
+        while True:
+            message = self.take()
+            if message is not None:
+                return message
+            data = await self._stream.read(RECV_SIZE)
+            if len(data) == 0:
+                raise ConnectionError("connection closed")
+            self.feed(data)
@@ -0,0 +1,180 @@
+import asyncio
+import random
+
+from typing import Awaitable, Dict, List, Optional
+
+from chinesecheckers.geometry import WIN_SLOTS
+from chinesecheckers.server.GameBoard import GameBoard
+from chinesecheckers.server.Player import Player
+
+# the most players a game can have, which is when the lobby
+# stops letting anyone else join it
+MAX_PLAYERS = len(WIN_SLOTS)-1
+# how many moves' worth of pacing to wait between sending the
+# board and asking for the first move
+_START_PACES = 2
+
+
+# one game being played on a GameHost, with its own players
+# and board. all of a host's games run on its event loop, so
+# nothing here needs a lock
+class Game(object):
+    __slots__ = (
+        "_GAME_ID",
+        "_players",
+        "_running",
+        "_accepting_players",
+        "_num_players",
+        "_board",
+        "_current_player",
+        "_pacing",
+        "_move_request",
+        "_move_requested",
+    )
+
+    def __init__(self, game_id: int, pacing: float = 0) -> None:
+        self._GAME_ID = game_id
+        # seconds between a move being made and the next one being
+        # asked for, so spectators can follow along. 0 asks straight
+        # away
+        self._pacing = pacing
+        self._players: List[Player] = []
+        self._running: bool = True
+        self._accepting_players: bool = True
+        # nobody's turn until create_game, since ids start at 1
+        self._current_player: int = 0
+        # the task that asks for the next move once the pacing is
+        # up, kept since the event loop only holds on to it weakly
+        self._move_request: Optional["asyncio.Task[None]"] = None
+        # whether the current player has been asked for their move
+        # yet. anything they send before then isn't taken as one
+        self._move_requested: bool = False
+
+    async def create_player(
+        self,
+        writer: asyncio.StreamWriter,
+        binary: bool = False,
+    ) -> Player:
+        player = Player(writer, len(self._players)+1, binary)
+        self._players.append(player)
+        if len(self._players) == MAX_PLAYERS:
+            self._accepting_players = False
+        await player.send("assign_id", player.PLAYER_ID)
+        return player
+
+    async def create_game(self) -> None:
+        self._accepting_players = False
+        self._num_players = len(self._players)
+        self._board = GameBoard(self._num_players, True)
+
+        self._current_player = random.randint(0, self._num_players-1)
+
+        await self._broadcast(0, "board_init", self._board.grid)
+        await self._broadcast(0, "starting_player", self._current_player+1)
+
+        self._next_player()
+        self._request_move_after(self._pacing*_START_PACES)
+
+    async def cancel(self) -> None:
+        # for a game that will never start. everyone still in it
+        # is told the game isn't taking them after all, and
+        # disconnected
+        self._accepting_players = False
+        self._running = False
+        for player in self._players:
+            await player.send("no")
+            player.close()
+
+    async def maybe_do_move(self, hops: List[List[int]], player_id: int) -> None:
+        if (
+            not self._running
+            or player_id != self._current_player
+            or not self._move_requested
+        ):
+            return
+
+        if self._board.maybe_do_move(hops, player_id):
+            await self._broadcast(0, "move", hops)
+            if self._board.remaining_players > 0:
+                # the turn passes before waiting, so nothing else
+                # the mover sends in the meantime is taken as a move
+                self._next_player()
+                self._request_move_after(self._pacing)
+            else:
+                await self._broadcast(0, "game_over")
+                self._running = False
+
+    def _request_move_after(self, delay: float) -> None:
+        # the request is left to a task of its own rather than
+        # waited for, so whoever's handler got here carries on
+        # reading. a request still waiting out its pacing is for a
+        # turn that has passed
+        if self._move_request is not None and not self._move_request.done():
+            self._move_request.cancel()
+        self._move_requested = False
+        self._move_request = asyncio.get_running_loop().create_task(
+            self._request_move(delay),
+        )
+
+    async def _request_move(self, delay: float) -> None:
+        if delay > 0:
+            await asyncio.sleep(delay)
+        # set before sending, since the reply can come in while the
+        # send is still draining
+        self._move_requested = True
+        await self._message_player(self._current_player, "request_move")
+
+    def _next_player(self) -> None:
+        self._current_player = (self._current_player+1) % (self._num_players+1)
+        if self._current_player == 0:
+            self._current_player = 1
+
+        while self._board.is_winner(self._current_player):
+            self._current_player = (self._current_player+1) % (self._num_players+1)
+            if self._current_player == 0:
+                self._current_player = 1
+
+    async def _broadcast(
+        self,
+        exclude_id: int,
+        msg: str,
+        payload: object = None
+    ) -> None:
+        # encoded at most once per encoding, however many players
+        # there are, and sent to them all at once so one slow
+        # player doesn't hold up the rest
+        encoded: Dict[bool, bytes] = {}
+        sends: List[Awaitable[None]] = []
+        for player in self._players:
+            if player.PLAYER_ID != exclude_id:
+                if player.binary not in encoded:
+                    encoded[player.binary] = player.encode(msg, payload)
+                sends.append(player.send_encoded(msg, payload, encoded[player.binary]))
+        await asyncio.gather(*sends)
+
+    async def _message_player(
+        self,
+        player_id: int,
+        msg: str,
+        payload: object = None
+    ) -> None:
+        for player in self._players:
+            if player.PLAYER_ID == player_id:
+                await player.send(msg, payload)
+
+    @property
+    def GAME_ID(self) -> int:
+        return self._GAME_ID
+
+    @property
+    def can_start(self) -> bool:
+        # whether there's a board for this many players
+        return WIN_SLOTS[len(self._players)] is not None
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    @property
+    def accepting_players(self) -> bool:
+        return self._accepting_players
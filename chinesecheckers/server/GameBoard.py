@@ -1,18 +1,34 @@
-from typing import List
+from typing import List, Sequence
 
-from chinesecheckers import point_in_board
-from chinesecheckers.Point2D import Point2D
-from chinesecheckers.Point3D import Point3D
+from chinesecheckers.geometry import (
+    CELLS,
+    CELL_SLOT,
+    NUM_CELLS,
+    SLOT_SIZE,
+    WIN_SLOTS,
+    cell_index,
+    count_slot_fill,
+    grid_is_hop,
+)
 
 
 class GameBoard(object):
-    __slots__ = ("_num_players", "_board", "_win_statuses", "_remaining_players")
+    __slots__ = (
+        "_num_players",
+        "_board",
+        "_win_statuses",
+        "_remaining_players",
+        "_slot_fill",
+    )
 
     def __init__(self, num_players: int, initialize_board: bool = False):
         self._num_players: int = num_players
         self._board: List[List[int]] = []
         self._win_statuses: List[bool] = [False] * (num_players+1)
         self._remaining_players: int = num_players
+        # _slot_fill[i] is how many of player i's pieces are in
+        # the slot they need to fill
+        self._slot_fill: List[int] = [0] * (num_players+1)
         if initialize_board:
             self.reset()
 
@@ -25,6 +41,9 @@ class GameBoard(object):
 
         for row in self._board:
             new_board._board.append(list(row))
+        new_board._win_statuses = list(self._win_statuses)
+        new_board._remaining_players = self._remaining_players
+        new_board._slot_fill = list(self._slot_fill)
 
         return new_board
 
@@ -112,135 +131,82 @@ class GameBoard(object):
             ]
         else:
             raise ValueError(f"Invalid number of players: {self._num_players}")
-
-    def maybe_do_move(self, hops: List[Point2D], player_id: int) -> bool:
-        if not point_in_board(hops[0]):
+        self._count_slot_fill()
+
+    def maybe_do_move(self, hops: Sequence[Sequence[int]], player_id: int) -> bool:
+        # hops are the [x, y] pairs straight off the wire. each one
+        # is only looked up in CELL_INDEX and HOPS, so checking a
+        # move doesn't build anything
+        source = cell_index(hops[0][0], hops[0][1])
+        if source == -1:
             return False
 
-        source_x = hops[0].x
-        source_y = hops[0].y
+        source_x, source_y = CELLS[source]
         if self._board[source_x][source_y] != player_id:
             # Cannot move a piece that is not your own
             return False
 
+        # possible adjacent hop
+        allow_single = len(hops) == 2
         piece = self._board[source_x][source_y]
         self._board[source_x][source_y] = 0
-        if len(hops) == 2:
-            # possible adjacent hop
-            if not self.is_valid_hop(hops[0], hops[1], True):
+        dest = source
+        # a chain that comes back to a cell it already visited
+        # could go round forever, so those are turned down. that
+        # also keeps a move short enough for the binary encoding's
+        # length byte (see protocol.py)
+        visited = [False]*NUM_CELLS
+        visited[source] = True
+        for i in range(1, len(hops)):
+            hop_source = dest
+            dest = cell_index(hops[i][0], hops[i][1])
+            if dest == -1 or visited[dest] or not grid_is_hop(
+                self._board,
+                hop_source,
+                dest,
+                allow_single,
+            ):
                 self._board[source_x][source_y] = piece
                 return False
-        else:
-            for i in range(len(hops)-1):
-                if not self.is_valid_hop(hops[i], hops[i+1], False):
-                    self._board[source_x][source_y] = piece
-                    return False
+            visited[dest] = True
 
-        self._board[hops[-1].x][hops[-1].y] = piece
-        self._check_winners()
+        dest_x, dest_y = CELLS[dest]
+        self._board[dest_x][dest_y] = piece
+        self._update_winner(player_id, source, dest)
         return True
 
-    def is_valid_hop(
-        self,
-        source: Point2D,
-        dest: Point2D,
-        allow_single: bool,
-    ) -> bool:
-        if not (point_in_board(source) and point_in_board(dest)):
-            # out of bounds
-            return False
-
-        if self._board[dest.x][dest.y] != 0:
-            # destination isn't empty
-            return False
-
-        source_3d = Point3D.from_2d(source)
-        dest_3d = Point3D.from_2d(dest)
-
-        step = Point3D.board_normalize(source_3d, dest_3d)
-
-        if step is None:
-            # hop is not in a straight line
-            return False
-
-        dx = step.x
-        dy = step.y
-        cur_x = source.x+dx
-        cur_y = source.y+dy
-        gaps: List[int] = [0]
-        while not (cur_x == dest.x and cur_y == dest.y):
-            if self._board[cur_x][cur_y] == 0:
-                gaps[-1] += 1
-            else:
-                if len(gaps) == 2:
-                    # more than one piece in between
-                    return False
-                gaps.append(0)
-            cur_x += dx
-            cur_y += dy
-
-        if len(gaps) == 1:
-            return gaps[0] == 0 and allow_single
-        else:
-            return gaps[0] == gaps[1]
-
-    # slot: one of the triangles surrounding the board where
-    # pieces start and end in. slot 0 is the top most, then
-    # ascending clockwise
-    _SLOT_BOUNDS = (
-        (9, 12, 3, False),
-        (13, 16, 4, True),
-        (9, 12, 12, False),
-        (4, 7, 13, True),
-        (0, 3, 12, False),
-        (4, 7, 4, True),
-    )
-
-    def _check_slot(
-        self,
-        slot_number: int,
-        player_id: int,
-    ) -> bool:
-        start_x, end_x, y_edge, pointing_up = GameBoard._SLOT_BOUNDS[slot_number]
-        if pointing_up:
-            scan = 4
-            for x in range(start_x, end_x+1):
-                for y in range(y_edge, y_edge+scan):
-                    if self._board[x][y] != player_id:
-                        return False
-                scan -= 1
-            return True
-        else:
-            scan = 0
-            for x in range(start_x, end_x+1):
-                for y in range(y_edge-scan, y_edge+1):
-                    if self._board[x][y] != player_id:
-                        return False
-                scan += 1
-            return True
-
-    # _WIN_SLOTS[i][j] is the slot that player j+1
-    # needs to fill to win, in a game of i players
-    _WIN_SLOTS = (
-        None,
-        None,
-        (3, 0),
-        (4, 0, 2),
-        (4, 5, 1, 2),
-        None,
-        (3, 4, 5, 0, 1, 2),
-    )
-
-    def _check_winners(self) -> None:
-        slots = GameBoard._WIN_SLOTS[self._num_players]
+    def _count_slot_fill(self) -> None:
+        slots = WIN_SLOTS[self._num_players]
         if slots is None:
             raise ValueError("bad num players")
 
         for i in range(len(slots)):
-            if not self._win_statuses[i+1] and self._check_slot(slots[i], i+1):
-                self._remaining_players -= 1
-                self._win_statuses[i+1] = True
-        print(self._win_statuses)
+            self._slot_fill[i+1] = count_slot_fill(
+                slots[i],
+                (
+                    cell
+                    for cell in range(NUM_CELLS)
+                    if self._board[CELLS[cell][0]][CELLS[cell][1]] == i+1
+                ),
+            )
+
+    def _update_winner(
+        self,
+        player_id: int,
+        source_cell: int,
+        dest_cell: int,
+    ) -> None:
+        # only the player who moved can have gained or lost a
+        # piece in their slot, so theirs is the only count to fix
+        target = WIN_SLOTS[self._num_players][player_id-1]  # type: ignore
+        if CELL_SLOT[source_cell] == target:
+            self._slot_fill[player_id] -= 1
+        if CELL_SLOT[dest_cell] == target:
+            self._slot_fill[player_id] += 1
+        if (not self._win_statuses[player_id]
+                and self._slot_fill[player_id] == SLOT_SIZE):
+            self._remaining_players -= 1
+            self._win_statuses[player_id] = True
 
     def is_winner(self, player_id: int) -> bool:
         return self._win_statuses[player_id]
@@ -248,3 +214,7 @@ class GameBoard(object):
     @property
     def remaining_players(self) -> int:
         return self._remaining_players
+
+    @property
+    def grid(self) -> List[List[int]]:
+        return self._board
@@ -1,141 +1,120 @@
-import json
-import random
-import time
-import socketserver
+import asyncio
 
-from typing import Tuple, cast, BinaryIO, List, Optional, Union
+from typing import List, Optional, Tuple, Union, cast
 
-from chinesecheckers.server.GameBoard import GameBoard
-from chinesecheckers.server.Player import Player
-from chinesecheckers.Point2D import Point2D
+from chinesecheckers.server.Game import Game
+from chinesecheckers.protocol import BINARY, HELLO, AsyncMessageReader, encode
 
-_ClientPayload = Union[int, bool, List[List[int]]]
+_ClientPayload = Union[int, bool, List[int], List[List[int]]]
 
 
-class GameHost(socketserver.ThreadingTCPServer):
-    class GameTCPHandler(socketserver.StreamRequestHandler):
-        def receive(self) -> Tuple[str, _ClientPayload]:
-            data = json.loads(self.rfile.readline().strip())
-            return (
-                data.get("msg", "error"),
-                data.get("payload")
-            )
+def _as_hops(data: _ClientPayload) -> Optional[List[List[int]]]:
+    # the payload of a make_move, if it is a list of [x, y]s.
+    # anything else is ignored rather than taking the handler down
+    if not isinstance(data, list) or len(data) == 0:
+        return None
+    for hop in data:
+        if not (
+            isinstance(hop, list)
+            and len(hop) == 2
+            and all(isinstance(i, int) for i in hop)
+        ):
+            return None
+    return cast(List[List[int]], data)
 
-        def handle(self) -> None:
-            msg, data = self.receive()
-            if not (msg == "hello" and data == 12345):
-                self.wfile.write(bytes('{"msg": "what"}', "ascii"))
-                return
-
-            # mypy thinks self.server is a socketserver.BaseServer
-            # when in fact it is a GameHost from this file
-            game = cast(GameHost, self.server)
-
-            if not game.accepting_players:
-                self.wfile.write(bytes('{"msg": "no"}', "ascii"))
-                return
-
-            player = game.create_player(self.rfile, self.wfile)
-            if player.PLAYER_ID == 1:
-                while not (msg == "ready" and data):
-                    msg, data = self.receive()
-                game.create_game()
-
-            while True:
-                msg, data = self.receive()
-
-                if msg == "make_move":
-                    assert isinstance(data, List)
-                    game.maybe_do_move(data, player.PLAYER_ID)
 
+# serves any number of games at once on one port. players who
+# connect join the lobby, the one game still taking players,
+# and a new lobby is opened whenever its first player starts
+# it, it fills up, or its first player leaves before starting it
+class GameHost(object):
     __slots__ = (
-        "_players",
-        "_running",
-        "_accepting_players",
-        "_num_players",
-        "_board",
-        "_current_player",
+        "_host",
+        "_port",
+        "_lobby",
+        "_games_created",
+        "_pacing",
     )
 
-    def __init__(self, host: str, port: int) -> None:
-        super().__init__((host, port), GameHost.GameTCPHandler)
-        self._players: List[Player] = []
-        self._running: bool = True
-        self._accepting_players: bool = True
-
-    def __enter__(self) -> "GameHost":
-        # silly mypy thinks that doing "with GameHost(..) as server"
-        # returns a socketserver.BaseServer unless i add this...
-        return self
-
-    def create_player(self, rfile: BinaryIO, wfile: BinaryIO) -> Player:
-        player = Player(rfile, wfile, len(self._players)+1)
-        self._players.append(player)
-        player.send("assign_id", str(player.PLAYER_ID))
-        return player
-
-    def create_game(self) -> None:
-        self._accepting_players = False
-        self._num_players = len(self._players)
-        self._board = GameBoard(self._num_players, True)
-
-        self._current_player = random.randint(0, self._num_players-1)
-
-        self._broadcast(0, "board_init", str(self._board))
-        self._broadcast(0, "starting_player", str(self._current_player+1))
-        time.sleep(1)
-
-        self._request_next_move()
-
-    def maybe_do_move(self, hops: List[List[int]], player_id: int) -> None:
-        if player_id != self._current_player:
-            return
-
-        hop_points = [Point2D(p[0], p[1]) for p in hops]
-        if self._board.maybe_do_move(hop_points, player_id):
-            self._broadcast(0, "move", str(hops))
-            if self._board.remaining_players > 0:
-                time.sleep(0.5)
-                self._request_next_move()
-            else:
-                self._broadcast(0, "game_over")
-                self._running = False
-
-    def _request_next_move(self) -> None:
-        self._current_player = (self._current_player+1) % (self._num_players+1)
-        if self._current_player == 0:
-            self._current_player = 1
-
-        while self._board.is_winner(self._current_player):
-            self._current_player = (self._current_player+1) % (self._num_players+1)
-            if self._current_player == 0:
-                self._current_player = 1
-        self._message_player(self._current_player, "request_move")
-
-    def _broadcast(
+    def __init__(self, host: str, port: int, pacing: float = 0) -> None:
+        self._host = host
+        self._port = port
+        # seconds every game waits between moves, see Game. 0 for
+        # bots playing each other, more if people are watching
+        self._pacing = pacing
+        self._games_created = 0
+        self._lobby = self._new_game()
+
+    async def serve_forever(self) -> None:
+        server = await asyncio.start_server(self._handle, self._host, self._port)
+        async with server:
+            await server.serve_forever()
+
+    def _new_game(self) -> Game:
+        self._games_created += 1
+        print(f"opening game {self._games_created}")
+        return Game(self._games_created, self._pacing)
+
+    def _join_lobby(self) -> Game:
+        if not self._lobby.accepting_players:
+            self._lobby = self._new_game()
+        return self._lobby
+
+    async def _handle(
         self,
-        exclude_id: int,
-        msg: str,
-        payload: Optional[str] = None
+        stream: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
     ) -> None:
-        for player in self._players:
-            if player.PLAYER_ID != exclude_id:
-                player.send(msg, payload)
-
-    def _message_player(
+        reader = AsyncMessageReader(stream)
+        try:
+            await self._play(reader, writer)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _play(
         self,
-        player_id: int,
-        msg: str,
-        payload: Optional[str] = None
+        reader: AsyncMessageReader,
+        writer: asyncio.StreamWriter,
     ) -> None:
-        for player in self._players:
-            if player.PLAYER_ID == player_id:
-                player.send(msg, payload)
-
-    @property
-    def running(self) -> bool:
-        return self._running
-
-    @property
-    def accepting_players(self) -> bool:
-        return self._accepting_players
+        msg, data = await self._receive(reader)
+        if not (msg == "hello" and data in (HELLO, [HELLO, BINARY])):
+            writer.write(encode("what"))
+            return
+        binary = data != HELLO
+        if binary:
+            reader.set_binary()
+
+        game = self._join_lobby()
+        player = await game.create_player(writer, binary)
+        if player.PLAYER_ID == 1:
+            # a ready with a number of players there's no board
+            # for is ignored, so whoever sent it can wait for more
+            try:
+                while not (msg == "ready" and data and game.can_start):
+                    msg, data = await self._receive(reader)
+            except ConnectionError:
+                # only player 1 can start a game, so nobody else in
+                # this one ever could. they are turned away, and
+                # whoever connects next gets a lobby of their own
+                if game is self._lobby:
+                    self._lobby = self._new_game()
+                await game.cancel()
+                raise
+            if game is self._lobby:
+                self._lobby = self._new_game()
+            await game.create_game()
+
+        while True:
+            msg, data = await self._receive(reader)
+
+            if msg == "make_move":
+                hops = _as_hops(data)
+                if hops is not None:
+                    await game.maybe_do_move(hops, player.PLAYER_ID)
+
+    @staticmethod
+    async def _receive(reader: AsyncMessageReader) -> Tuple[str, _ClientPayload]:
+        msg, payload = await reader.receive()
+        return msg, cast(_ClientPayload, payload)
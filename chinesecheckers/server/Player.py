@@ -1,28 +1,51 @@
-from typing import BinaryIO, Optional
+import asyncio
+
+from chinesecheckers.protocol import encode, encode_binary
 
 
 class Player(object):
-    __slots__ = ("_rfile", "_wfile", "_PLAYER_ID")
+    __slots__ = ("_writer", "_PLAYER_ID", "_binary")
 
-    def __init__(self, rfile: BinaryIO, wfile: BinaryIO, player_id: int):
-        self._rfile = rfile
-        self._wfile = wfile
+    def __init__(
+        self,
+        writer: asyncio.StreamWriter,
+        player_id: int,
+        binary: bool = False,
+    ):
+        self._writer = writer
         self._PLAYER_ID = player_id
+        # whether this player asked for the binary encoding
+        self._binary = binary
+
+    def encode(self, msg: str, payload: object = None) -> bytes:
+        if self._binary:
+            return encode_binary(msg, payload)
+        return encode(msg, payload)
+
+    async def send(self, msg: str, payload: object = None) -> None:
+        await self.send_encoded(msg, payload, self.encode(msg, payload))
 
-    def send(self, msg: str, payload: Optional[str] = None) -> None:
-        if payload is None:
-            print(f'sending {{"msg": "{msg}"}} to {self._PLAYER_ID}')
-            self._wfile.write(bytes(
-                f'{{"msg": "{msg}"}}',
-                "ascii"
-            ))
-        else:
-            print(f'sending {{"msg": "{msg}", "payload": {payload}}} to {self._PLAYER_ID}')
-            self._wfile.write(bytes(
-                f'{{"msg": "{msg}", "payload": {payload}}}',
-                "ascii"
-            ))
+    async def send_encoded(self, msg: str, payload: object, data: bytes) -> None:
+        # sends data, which is msg and payload already encoded the
+        # way this player wants, so a broadcast only encodes once.
+        # waits while the player is too far behind reading what it
+        # was sent, so its buffer can't grow without end. only the
+        # player's own game waits, never the other games being served
+        print(f"sending {msg} {payload} to {self._PLAYER_ID}")
+        self._writer.write(data)
+        try:
+            await self._writer.drain()
+        except ConnectionError:
+            # the player's own handler finds out it's gone
+            pass
+
+    def close(self) -> None:
+        self._writer.close()
 
     @property
     def PLAYER_ID(self) -> int:
         return self._PLAYER_ID
+
+    @property
+    def binary(self) -> bool:
+        return self._binary
@@ -1,5 +1,4 @@
 import collections
-import json
 import socket
 import threading
 
@@ -7,6 +6,9 @@ from typing import Deque, Dict, List, Optional, Sequence, Tuple, Union, cast
 
 import pygame  # type: ignore
 
+from chinesecheckers.geometry import CELLS, CELL_INDEX, JUMPS, NEIGHBOURS, NUM_CELLS, grid_hop
+from chinesecheckers.protocol import MessageReader, encode
+
 HOST = "127.0.0.1"
 PORT = 41047
 
@@ -27,19 +29,10 @@ COLOURS = [
 ]
 NAMES = ["", "red", "green", "blue", "yellow", "magenta", "cyan"]
 
-DELTAS = [
-    (1, 0),
-    (-1, 0),
-    (0, 1),
-    (0, -1),
-    (-1, 1),
-    (1, -1)
-]
-
 pygame.init()
 comicsans_28 = pygame.font.SysFont("Comic Sans MS", 28)
 
-ClientPayload = Optional[Union[str, List[Tuple[int, int]]]]
+ClientPayload = Optional[Union[int, bool, List[Tuple[int, int]]]]
 ServerMessage = Optional[Union[int, List[List[int]]]]
 PossibleMoveList = Dict[Tuple[int, int], List[Tuple[int, int]]]
 
@@ -140,81 +133,40 @@ def draw_hop_overlay(surf: pygame.Surface, hops: List[Tuple[int, int]]) -> None:
         )
 
 
-def in_board(x: int, y: int) -> bool:
-    return x >= 0 and x < BOARD_SIZE and y >= 0 and y < BOARD_SIZE
-
-
-def scan(
-    board: List[List[int]],
-    source_x: int, source_y: int,
-    dx: int, dy: int
-) -> Optional[Tuple[int, int]]:
-    cur_x = source_x+dx
-    cur_y = source_y+dy
-    if not in_board(cur_x, cur_y):
-        return None
-
-    dist = 1
-    while board[cur_x][cur_y] == 0:
-        cur_x += dx
-        cur_y += dy
-        dist += 1
-        if not in_board(cur_x, cur_y):
-            return None
-
-    if board[cur_x][cur_y] == -1:
-        return None
-
-    cur_x += dx
-    cur_y += dy
-    if not in_board(cur_x, cur_y) or board[cur_x][cur_y] != 0:
-        return None
-
-    dist -= 1
-    while dist > 0:
-        cur_x += dx
-        cur_y += dy
-        dist -= 1
-        if not in_board(cur_x, cur_y) or board[cur_x][cur_y] != 0:
-            return None
-
-    return (cur_x, cur_y)
-
-
 def get_possible(
     board: List[List[int]],
     source: Tuple[int, int]
 ) -> PossibleMoveList:
     possible: PossibleMoveList = {}
-    visited = [[False]*BOARD_SIZE for _ in range(BOARD_SIZE)]
-    q: Deque[Tuple[int, int]] = collections.deque()
-    q.append(source)
-    visited[source[0]][source[1]] = True
+    visited = [False]*NUM_CELLS
+    q: Deque[int] = collections.deque()
+    source_cell = CELL_INDEX[source[0]][source[1]]
+    q.append(source_cell)
+    visited[source_cell] = True
 
     original = board[source[0]][source[1]]
     board[source[0]][source[1]] = 0
 
-    for direction in DELTAS:
-        x = source[0]+direction[0]
-        y = source[1]+direction[1]
-        if in_board(x, y) and board[x][y] == 0:
+    for cell in NEIGHBOURS[source_cell]:
+        x, y = CELLS[cell]
+        if board[x][y] == 0:
             possible[(x, y)] = [source, (x, y)]
 
     while len(q) > 0:
         p = q.popleft()
-        print(p)
+        print(CELLS[p])
 
-        for direction in DELTAS:
-            maybe_dest = scan(board, p[0], p[1], direction[0], direction[1])
-            if maybe_dest is not None and not visited[maybe_dest[0]][maybe_dest[1]]:
-                visited[maybe_dest[0]][maybe_dest[1]] = True
+        for jumps in JUMPS[p]:
+            maybe_dest = grid_hop(board, jumps)
+            if maybe_dest != -1 and not visited[maybe_dest]:
+                visited[maybe_dest] = True
                 q.append(maybe_dest)
-                if p == source:
-                    possible[maybe_dest] = [source, maybe_dest]
+                if p == source_cell:
+                    possible[CELLS[maybe_dest]] = [source, CELLS[maybe_dest]]
                 else:
-                    new = list(possible[p])
-                    new.append(maybe_dest)
-                    possible[maybe_dest] = new
+                    new = list(possible[CELLS[p]])
+                    new.append(CELLS[maybe_dest])
+                    possible[CELLS[maybe_dest]] = new
 
     board[source[0]][source[1]] = original
     return possible
@@ -223,31 +175,19 @@ def get_possible(
 with socket.socket() as sock:
     sock.connect((HOST, PORT))
 
+    reader = MessageReader(sock)
+
     def send(msg: str, payload: ClientPayload) -> None:
-        print(
-            f'sending {{"msg": "{msg}", "payload": {payload}}}\n'
-                .replace("(", "[")  # noqa - flake8 wants it one tab left, which is nonsense
-                .replace(")", "]")
-        )
-        sock.send(bytes(
-            f'{{"msg": "{msg}", "payload": {payload}}}\n'
-                .replace("(", "[")  # noqa
-                .replace(")", "]"),
-            "ascii"
-        ))
+        data = encode(msg, payload)
+        print("sending", data.decode("ascii"), end="")
+        sock.sendall(data)
 
     def receive() -> Tuple[str, ServerMessage]:
-        msg: List[bytes] = []
-        while len(msg) == 0 or msg[-1][-1] != ord("}"):
-            msg.append(sock.recv(256))
-        data = json.loads(b"".join(msg))  # type: ignore
-        print(data)
-        return (
-            data.get("msg", "error"),
-            data.get("payload", None)
-        )
+        msg, payload = reader.receive()
+        print(msg, payload)
+        return msg, cast(ServerMessage, payload)
 
-    send("hello", "12345")
+    send("hello", 12345)
     msg, payload = receive()
     if msg == "no":
         raise RuntimeError("server not accepting new players")
@@ -258,7 +198,7 @@ with socket.socket() as sock:
     print(f"You are player {player_id} ({NAMES[player_id]})")
     if player_id == 1:
         input("press enter to start the game")
-        send("ready", "true")  # str(True) -> "True" which is not valid json
+        send("ready", True)
 
     msg, payload = receive()
     if msg != "board_init":
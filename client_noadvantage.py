@@ -1,5 +1,3 @@
-import json
-import math
 import socket
 import threading
 
@@ -7,6 +5,9 @@ from typing import Dict, List, Optional, Sequence, Tuple, Union, cast
 
 import pygame  # type: ignore
 
+from chinesecheckers.geometry import NEIGHBOURS, cell_index, grid_is_hop
+from chinesecheckers.protocol import MessageReader, encode
+
 HOST = "127.0.0.1"
 PORT = 41047
 
@@ -27,12 +28,11 @@ COLOURS = [
 ]
 NAMES = ["", "red", "green", "blue", "yellow", "magenta", "cyan"]
 
-SQRT_2 = math.sqrt(2)
 
 pygame.init()
 comicsans_28 = pygame.font.SysFont("Comic Sans MS", 28)
 
-ClientPayload = Optional[Union[str, List[Tuple[int, int]]]]
+ClientPayload = Optional[Union[int, bool, List[Tuple[int, int]]]]
 ServerMessage = Optional[Union[int, List[List[int]]]]
 PossibleMoveList = Dict[Tuple[int, int], List[Tuple[int, int]]]
 
@@ -138,76 +138,32 @@ def is_valid_hop(
     dest: Tuple[int, int],
     is_first: bool
 ) -> Tuple[bool, bool]:
-    if (source[0] < 0
-        or source[1] < 0
-        or dest[0] < 0
-        or dest[1] < 0
-        or source[0] >= BOARD_SIZE
-        or source[1] >= BOARD_SIZE
-        or dest[0] >= BOARD_SIZE
-        or dest[1] >= BOARD_SIZE
-    ):
-        return (False, False)
-    if board[dest[0]][dest[1]] != 0:
+    source_cell = cell_index(source[0], source[1])
+    dest_cell = cell_index(dest[0], dest[1])
+    if source_cell == -1 or dest_cell == -1:
         return (False, False)
 
-    diff = (dest[0]-source[0], dest[1]-source[1])
-    board_dist = math.hypot(diff[0], diff[1], -diff[0] - diff[1]) / SQRT_2
-
-    if not board_dist.is_integer():
+    if not grid_is_hop(board, source_cell, dest_cell, is_first):
         return (False, False)
-    board_dist = int(board_dist)
-
-    dx = diff[0]//board_dist
-    dy = diff[1]//board_dist
-
-    cur_x = source[0]+dx
-    cur_y = source[1]+dy
-    gaps: List[int] = [0]
-    while not (cur_x == dest[0] and cur_y == dest[1]):
-        if board[cur_x][cur_y] == 0:
-            gaps[-1] += 1
-        else:
-            if len(gaps) == 2:
-                return (False, False)
-            gaps.append(0)
-        cur_x += dx
-        cur_y += dy
-
-    if len(gaps) == 1:
-        return (gaps[0] == 0 and is_first, True)
-    else:
-        return (gaps[0] == gaps[1], False)
+    return (True, dest_cell in NEIGHBOURS[source_cell])
 
 
 with socket.socket() as sock:
     sock.connect((HOST, PORT))
 
+    reader = MessageReader(sock)
+
     def send(msg: str, payload: ClientPayload) -> None:
-        print(
-            f'sending {{"msg": "{msg}", "payload": {payload}}}\n'
-                .replace("(", "[")  # noqa - flake8 wants it one tab left, which is nonsense
-                .replace(")", "]")
-        )
-        sock.send(bytes(
-            f'{{"msg": "{msg}", "payload": {payload}}}\n'
-                .replace("(", "[")  # noqa
-                .replace(")", "]"),
-            "ascii"
-        ))
+        data = encode(msg, payload)
+        print("sending", data.decode("ascii"), end="")
+        sock.sendall(data)
 
     def receive() -> Tuple[str, ServerMessage]:
-        msg: List[bytes] = []
-        while len(msg) == 0 or msg[-1][-1] != ord("}"):
-            msg.append(sock.recv(256))
-        data = json.loads(b"".join(msg))  # type: ignore
-        print(data)
-        return (
-            data.get("msg", "error"),
-            data.get("payload", None)
-        )
+        msg, payload = reader.receive()
+        print(msg, payload)
+        return msg, cast(ServerMessage, payload)
 
-    send("hello", "12345")
+    send("hello", 12345)
     msg, payload = receive()
     if msg == "no":
         raise RuntimeError("server not accepting new players")
@@ -218,7 +174,7 @@ with socket.socket() as sock:
     print(f"You are player {player_id} ({NAMES[player_id]})")
     if player_id == 1:
         input("press enter to start the game")
-        send("ready", "true")  # str(True) -> "True" which is not valid json
+        send("ready", True)
 
     msg, payload = receive()
     if msg != "board_init":
@@ -1,13 +1,9 @@
-import threading
-import time
+import asyncio
 
 from chinesecheckers.server.GameHost import GameHost
 
-with GameHost("0.0.0.0", 41047) as server:
-    server_thread = threading.Thread(target=server.serve_forever, daemon=True)
-    server_thread.start()
+# seconds between moves. 0 for bot matches, something like
+# 0.5 for people watching in client.py
+PACING = 0.5
 
-    while server.running:
-        time.sleep(0.5)
-
-    server.shutdown()
+asyncio.run(GameHost("0.0.0.0", 41047, PACING).serve_forever())